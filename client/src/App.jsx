@@ -15,6 +15,7 @@ import AdminLogin from './pages/AdminLogin';
 import BlogPage from './pages/Blog';
 import Checkout from './pages/checkout';
 import OrderSuccess from './pages/ordersuccess.jsx';
+import MyOrders from './pages/MyOrders';
 
 const App = () => {
   return (
@@ -33,6 +34,10 @@ const App = () => {
             <Route path="/admin/login" element={<AdminLogin />} />
             <Route path="/checkout" element={<Checkout />} />
             <Route path="/order-success" element={<OrderSuccess />} />
+            <Route
+              path="/my-orders"
+              element={localStorage.getItem('jwt_token') ? <MyOrders /> : <Navigate to="/login" replace />}
+            />
             <Route
               path="/admin/*"
               element={
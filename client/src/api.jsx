@@ -29,7 +29,11 @@ export const api = {
     update: (userId) => `${API_CONFIG.API_BASE_URL}profile?user_id=${userId}`,
   },
   products: {
-    list: () => `${API_CONFIG.API_BASE_URL}products`,
+    // Full catalog as a plain array (legacy shape)
+    list: () => `${API_CONFIG.API_BASE_URL}products?all=true`,
+    // Keyset-paginated: { products, next_cursor, has_more }
+    page: (cursor, limit = 24) =>
+      `${API_CONFIG.API_BASE_URL}products?limit=${limit}${cursor ? `&cursor=${cursor}` : ''}`,
     create: () => `${API_CONFIG.API_BASE_URL}products`,
     update: (id) => `${API_CONFIG.API_BASE_URL}products/${id}`,
     delete: (id) => `${API_CONFIG.API_BASE_URL}products/${id}`,
@@ -42,6 +46,14 @@ export const api = {
     list: () => `${API_CONFIG.API_BASE_URL}orders`,
     create: () => `${API_CONFIG.API_BASE_URL}orders`,
     update: (orderId) => `${API_CONFIG.API_BASE_URL}orders/${orderId}`,
+    // Signed-in user's own history: { orders, next_cursor, has_more }
+    mine: (cursor, limit = 20) =>
+      `${API_CONFIG.API_BASE_URL}me/orders?limit=${limit}${cursor ? `&cursor=${cursor}` : ''}`,
+  },
+  admin: {
+    // Daily sales rollups: { totals, daily, top_products, categories }
+    stats: (from, to) =>
+      `${API_CONFIG.API_BASE_URL}admin/stats?from=${from}&to=${to}`,
   },
   collaborate: {
     submit: () => `${API_CONFIG.API_BASE_URL}collaborate`,
@@ -55,11 +67,16 @@ export const api = {
     upload: () => `${API_CONFIG.API_BASE_URL}blog/upload`,
   },
 
+  search: (query, type = 'all', page = 1) =>
+    `${API_CONFIG.API_BASE_URL}search?q=${encodeURIComponent(query)}&type=${type}&page=${page}`,
+
   cart: {
     list: () => `${API_CONFIG.API_BASE_URL}cart`,
     add: () => `${API_CONFIG.API_BASE_URL}cart`,
     update: (id) => `${API_CONFIG.API_BASE_URL}cart/${id}`,
     remove: (id) => `${API_CONFIG.API_BASE_URL}cart/${id}`,
+    // PATCH { operations: [{ op: 'add' | 'set' | 'remove', product_id, quantity }] }
+    batch: () => `${API_CONFIG.API_BASE_URL}cart`,
   },
 
   // Checkout (uses orders.create)
@@ -105,6 +105,13 @@ const Navbar = () => {
                   >
                     Client
                   </Link>
+                  <Link
+                    to="/my-orders"
+                    onClick={() => setIsLoginDropdownOpen(false)}
+                    className="block px-4 py-2 text-black hover:bg-gray-100 font-montserrat"
+                  >
+                    My Orders
+                  </Link>
                 </div>
               )}
             </div>
@@ -1,4 +1,4 @@
-import { createContext, useContext, useState, useEffect } from 'react';
+import { createContext, useContext, useState, useEffect, useRef } from 'react';
 import { api, fetchApi } from '../api';
 
 const CartContext = createContext();
@@ -51,15 +51,25 @@ export const CartProvider = ({ children }) => {
     }
   };
 
+  // === BATCH OPERATIONS (one request, returns the new cart) ===
+  const applyCartOperations = async (operations) => {
+    const data = await fetchApi(api.cart.batch(), {
+      method: 'PATCH',
+      body: JSON.stringify({ operations }),
+    });
+    setCartItems(data.items);
+    setCartCount(data.cart_count);
+    return data;
+  };
+
+  const productIdFor = (itemId) =>
+    cartItems.find((item) => item.id === itemId)?.product_id;
+
   // === UPDATE QUANTITY ===
   const updateQuantity = async (itemId, quantity) => {
     if (quantity < 1) return;
     try {
-      await fetchApi(api.cart.update(itemId), {
-        method: 'PUT',
-        body: JSON.stringify({ quantity }),
-      });
-      await loadCart();
+      await applyCartOperations([{ op: 'set', product_id: productIdFor(itemId), quantity }]);
     } catch (err) {
       showToast('Update failed');
     }
@@ -68,25 +78,32 @@ export const CartProvider = ({ children }) => {
   // === REMOVE ITEM ===
   const removeFromCart = async (itemId) => {
     try {
-      await fetchApi(api.cart.remove(itemId), { method: 'DELETE' });
-      await loadCart();
+      await applyCartOperations([{ op: 'remove', product_id: productIdFor(itemId) }]);
     } catch (err) {
       showToast('Remove failed');
     }
   };
 
   // === CHECKOUT ===
+  // One Idempotency-Key per checkout attempt: retries after a network
+  // failure reuse it, so the server places the order at most once
+  const checkoutKey = useRef(null);
   const checkout = async (shipping, paymentMethod) => {
+    if (!checkoutKey.current) checkoutKey.current = crypto.randomUUID();
     try {
-      await fetchApi(api.checkout(), {
+      const order = await fetchApi(api.checkout(), {
         method: 'POST',
+        headers: { 'Idempotency-Key': checkoutKey.current },
         body: JSON.stringify({ shipping, payment_method: paymentMethod }),
       });
+      checkoutKey.current = null;
       setCartItems([]);
       setCartCount(0);
       showToast('Order placed!');
-      return response;
+      return order;
     } catch (err) {
+      // fetch rejects with a TypeError when no response arrived; any answer ends the attempt
+      if (!(err instanceof TypeError)) checkoutKey.current = null;
       showToast(err.message || 'Checkout failed');
       throw err;
     }
@@ -108,6 +125,7 @@ export const CartProvider = ({ children }) => {
         addToCart,
         updateQuantity,
         removeFromCart,
+        applyCartOperations,
         checkout,
         mergeOnLogin,
         loadCart,
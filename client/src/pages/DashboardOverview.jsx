@@ -1,14 +1,30 @@
 import { useState, useEffect } from 'react';
+import { api, fetchApi } from '../api';
+
+const STATS_DAYS = 30;
+
+const isoDay = (date) => date.toISOString().slice(0, 10);
 
 const DashboardOverview = () => {
   const [stats, setStats] = useState({ totalOrders: 0, totalRevenue: 0, topItems: [] });
 
   useEffect(() => {
-    setStats({
-      totalOrders: 150,
-      totalRevenue: 12500.50,
-      topItems: ['Handbag', 'Backpack', 'Tote'],
-    });
+    const fetchStats = async () => {
+      // Last STATS_DAYS days, aggregated server-side from the daily rollups
+      const to = new Date();
+      const from = new Date(to.getTime() - (STATS_DAYS - 1) * 24 * 60 * 60 * 1000);
+      try {
+        const data = await fetchApi(api.admin.stats(isoDay(from), isoDay(to)));
+        setStats({
+          totalOrders: data.totals.orders,
+          totalRevenue: data.totals.revenue,
+          topItems: data.top_products.map((product) => product.name || `Product #${product.product_id}`),
+        });
+      } catch (err) {
+        console.error('Error fetching stats:', err);
+      }
+    };
+    fetchStats();
   }, []);
 
   return (
@@ -38,4 +54,4 @@ const DashboardOverview = () => {
   );
 };
 
-export default DashboardOverview;
\ No newline at end of file
+export default DashboardOverview;
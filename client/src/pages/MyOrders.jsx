@@ -0,0 +1,87 @@
+import React, { useEffect, useState } from 'react';
+import { Link } from 'react-router-dom';
+import Navbar from '../components/Navbar';
+import Footer from '../components/Footer';
+import { api, fetchApi } from '../api';
+
+const MyOrders = () => {
+  const [orders, setOrders] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loading, setLoading] = useState(true);
+  const [error, setError] = useState('');
+
+  // Newest first, one page at a time via next_cursor
+  const loadPage = async (cursor) => {
+    setLoading(true);
+    try {
+      const data = await fetchApi(api.orders.mine(cursor));
+      setOrders((prev) => (cursor ? [...prev, ...data.orders] : data.orders));
+      setNextCursor(data.has_more ? data.next_cursor : null);
+      setError('');
+    } catch (err) {
+      setError(err.message || 'Could not load your orders');
+    } finally {
+      setLoading(false);
+    }
+  };
+
+  useEffect(() => {
+    loadPage(null);
+  }, []);
+
+  return (
+    <div className="min-h-screen bg-gray-50 flex flex-col">
+      <Navbar />
+      <div className="flex-1 container mx-auto py-12 px-4 max-w-3xl">
+        <h1 className="text-3xl font-montserrat mb-6">My Orders</h1>
+
+        {error && <p className="text-red-600 mb-4">{error}</p>}
+
+        {!loading && !error && orders.length === 0 && (
+          <p className="text-gray-600">
+            You have no orders yet.{' '}
+            <Link to="/shop" className="underline">Start shopping</Link>
+          </p>
+        )}
+
+        <div className="space-y-4">
+          {orders.map((order) => (
+            <div key={order.id} className="bg-white p-6 rounded-lg shadow">
+              <div className="flex justify-between items-center mb-3">
+                <div>
+                  <p className="font-montserrat font-semibold">Order #{order.id}</p>
+                  <p className="text-sm text-gray-500">
+                    {order.created_at ? new Date(order.created_at).toLocaleString() : ''}
+                  </p>
+                </div>
+                <span className="px-3 py-1 rounded-full bg-gray-100 text-sm capitalize">{order.status}</span>
+              </div>
+              <ul className="divide-y text-sm">
+                {order.items.map((item) => (
+                  <li key={item.id} className="py-2 flex justify-between">
+                    <span>{item.name} × {item.quantity}</span>
+                    <span>${item.total.toFixed(2)}</span>
+                  </li>
+                ))}
+              </ul>
+              <p className="text-right font-semibold mt-3">Total: ${order.total_price.toFixed(2)}</p>
+            </div>
+          ))}
+        </div>
+
+        {nextCursor && (
+          <button
+            onClick={() => loadPage(nextCursor)}
+            disabled={loading}
+            className="mt-6 px-6 py-3 bg-black text-white rounded hover:bg-gray-800 transition font-montserrat disabled:opacity-50"
+          >
+            {loading ? 'Loading...' : 'Load more'}
+          </button>
+        )}
+      </div>
+      <Footer />
+    </div>
+  );
+};
+
+export default MyOrders;
@@ -45,6 +45,12 @@ const OrderSuccess = () => {
           >
             Continue Shopping
           </Link>
+          <Link
+            to="/my-orders"
+            className="block mt-4 text-sm text-gray-600 underline font-montserrat"
+          >
+            View my orders
+          </Link>
         </div>
       </div>
       <Footer />
@@ -1,11 +1,12 @@
 from fileinput import filename
-from flask import Flask, app, send_from_directory
+from flask import Flask, app, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from flask_mail import Mail
 from flask import signals
+from werkzeug.exceptions import RequestEntityTooLarge
 from config import DevelopmentConfig, ProductionConfig
 import os
 
@@ -37,8 +38,8 @@ def create_app(config_class=DevelopmentConfig):
                 "https://nerakcos.vercel.app", 
                 "https://nerakcos-1.onrender.com"
             ],
-            "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-            "allow_headers": ["Content-Type", "Authorization"],
+            "methods": ["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
+            "allow_headers": ["Content-Type", "Authorization", "Idempotency-Key"],
             "supports_credentials": True
         }}
     )
@@ -48,13 +49,15 @@ def create_app(config_class=DevelopmentConfig):
     from app.routes.auth import bp as auth_bp
     from app.routes.products import bp as products_bp
     from app.routes.home import bp as home_bp
-    from app.routes.orders import bp as orders_bp
+    from app.routes.orders import bp as orders_bp, init_orders
     from app.routes.profile import bp as profile_bp
     from app.routes.blog import bp as blog_bp
     from app.routes.collaborate import bp as collaborate_bp
     from app.routes.categories import bp as categories_bp, initialize_default_categories
     from app.routes.upload import upload_bp, init_upload
-    from app.routes.cart import bp as cart_bp
+    from app.routes.cart import bp as cart_bp, init_cart
+    from app.routes.search import bp as search_bp
+    from app.routes.admin import bp as admin_bp
 
     app.register_blueprint(contact_bp, url_prefix='/api')
     app.register_blueprint(auth_bp, url_prefix='/api')
@@ -67,9 +70,22 @@ def create_app(config_class=DevelopmentConfig):
     app.register_blueprint(collaborate_bp, url_prefix='/api')
     app.register_blueprint(categories_bp, url_prefix='/api')
     app.register_blueprint(upload_bp, url_prefix='/api')
+    app.register_blueprint(search_bp, url_prefix='/api')
+    app.register_blueprint(admin_bp, url_prefix='/api')
 
     # Initialize upload configuration
     init_upload(app)
+    # Periodic guest cart expiry and stock hold release
+    init_cart(app)
+    # Periodic order archival
+    init_orders(app)
+    # Idempotency-Key store and its expiry sweep
+    from app.idempotency import init_idempotency
+    init_idempotency(app)
+
+    # Shared response cache for catalog reads
+    from app.cache import init_cache
+    init_cache(app)
 
     # JWT Configuration - FIXED VERSION
     @jwt.user_identity_loader
@@ -98,9 +114,27 @@ def create_app(config_class=DevelopmentConfig):
     #         print(f"File not found: {filename} in {upload_dir}") 
     #         return "File not found", 404
 
-    @app.route('/static/uploads/products/<path:filename>')
+    @app.errorhandler(RequestEntityTooLarge)
+    def request_too_large(error):
+        # Per-file limits carry their own message; the request-wide one does not
+        if error.description == RequestEntityTooLarge.description:
+            limit = app.config['MAX_CONTENT_LENGTH'] / (1024 * 1024)
+            return jsonify({"error": f"Upload too large (max {limit:g}MB per request)"}), 413
+        return jsonify({"error": error.description}), 413
+
+    @app.route('/static/uploads/<path:filename>')
     def serve_uploaded_file(filename):
-        return send_from_directory(os.path.join(app.root_path, 'static', 'uploads', 'products'), filename)
+        from app.uploads import send_upload
+        return send_upload(filename)
+
+    # gzip / brotli for JSON and text responses, streamed ones included
+    if app.config.get('COMPRESSION_ENABLED', True):
+        from app.compression import CompressionMiddleware
+        app.wsgi_app = CompressionMiddleware(
+            app.wsgi_app,
+            min_size=app.config.get('COMPRESSION_MIN_SIZE', 500),
+            level=app.config.get('COMPRESSION_LEVEL', 6),
+        )
 
     # Initialize default categories on first app request using signal
     def initialize_categories():
@@ -0,0 +1,162 @@
+"""Monthly archive tables for finished orders.
+
+archive_orders() moves completed / cancelled orders past a cutoff age out
+of orders and order_lines into orders_archive_<YYYY_MM> and
+order_lines_archive_<YYYY_MM>, keyed by the month each order was placed.
+Rows keep their ids, and each batch is copied and deleted in one
+transaction. orders / order_lines ids are AUTOINCREMENT on SQLite, so an
+archived id is never handed out again. order_archives lists the months that exist.
+
+History reads go through order_history() / line_history(), which UNION ALL
+the hot tables with the archive months. Every header row carries an
+archive_month column, so lines are only read from the tables their
+orders actually live in.
+"""
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import Column, Index, MetaData, String, Table, delete, literal, select, union_all, update
+
+from app import db
+from app.models import Order, OrderArchive, OrderLine
+
+ORDER_FIELDS = tuple(column.name for column in Order.__table__.columns)
+LINE_FIELDS = tuple(column.name for column in OrderLine.__table__.columns)
+
+_metadata = MetaData()
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def _copy_columns(source):
+    # No foreign keys: archived lines outlive the hot order rows
+    return [
+        Column(column.name, column.type, primary_key=column.primary_key,
+               nullable=column.nullable, autoincrement=False)
+        for column in source.columns
+    ]
+
+
+def archive_tables(month):
+    """(orders, order_lines) archive Tables for a 'YYYY_MM' month"""
+    with _tables_lock:
+        if month not in _tables:
+            orders = Table(f'orders_archive_{month}', _metadata, *_copy_columns(Order.__table__))
+            Index(f'ix_orders_archive_{month}_user_created', orders.c.user_id, orders.c.created_at)
+            Index(f'ix_orders_archive_{month}_status_id', orders.c.status, orders.c.id)
+            lines = Table(f'order_lines_archive_{month}', _metadata, *_copy_columns(OrderLine.__table__))
+            Index(f'ix_order_lines_archive_{month}_order_id', lines.c.order_id)
+            _tables[month] = (orders, lines)
+        return _tables[month]
+
+
+def archive_months(start=None, end=None):
+    """Archived months, oldest first, optionally limited to those overlapping start..end (dates or datetimes)"""
+    query = select(OrderArchive.month).order_by(OrderArchive.month)
+    if start is not None:
+        query = query.where(OrderArchive.month >= start.strftime('%Y_%m'))
+    if end is not None:
+        query = query.where(OrderArchive.month <= end.strftime('%Y_%m'))
+    return list(db.session.execute(query).scalars())
+
+
+def order_history(conditions, months):
+    """Order headers from orders and the given archive months, as one subquery.
+
+    conditions(table) returns the WHERE clauses for one source table, so
+    filters and keyset bounds are applied inside every UNION branch.
+    """
+    sources = [(None, Order.__table__)] + [(month, archive_tables(month)[0]) for month in months]
+    branches = [
+        select(*(table.c[name] for name in ORDER_FIELDS), literal(month, String(7)).label('archive_month'))
+        .where(*conditions(table))
+        for month, table in sources
+    ]
+    history = union_all(*branches) if len(branches) > 1 else branches[0]
+    return history.subquery('order_history')
+
+
+def line_history(ids_by_month):
+    """Order lines for {archive month or None: [order ids]}, with archive_month, ordered by line id"""
+    branches = []
+    for month, order_ids in ids_by_month.items():
+        table = OrderLine.__table__ if month is None else archive_tables(month)[1]
+        branches.append(
+            select(*(table.c[name] for name in LINE_FIELDS), literal(month, String(7)).label('archive_month'))
+            .where(table.c.order_id.in_(order_ids))
+        )
+    history = (union_all(*branches) if len(branches) > 1 else branches[0]).subquery('line_history')
+    return select(history).order_by(history.c.id)
+
+
+def _ensure_month(month):
+    orders, lines = archive_tables(month)
+    connection = db.session.connection()
+    orders.create(connection, checkfirst=True)
+    lines.create(connection, checkfirst=True)
+    if db.session.get(OrderArchive, month) is None:
+        db.session.add(OrderArchive(month=month, order_count=0))
+        db.session.flush()
+    return orders, lines
+
+
+def archive_orders(after_days, statuses, batch_size=500):
+    """Move orders in `statuses` placed more than after_days ago into the archive.
+
+    Takes the oldest batch_size matching orders per transaction, so the hot
+    tables are never locked for the whole run. Returns orders and lines
+    moved, the months written to and elapsed time.
+    """
+    started = time.monotonic()
+    cutoff = datetime.utcnow() - timedelta(days=after_days)
+    stats = {'orders': 0, 'lines': 0}
+    months = set()
+    ready = set()
+    order_columns = [Order.__table__.c[name] for name in ORDER_FIELDS]
+    line_columns = [OrderLine.__table__.c[name] for name in LINE_FIELDS]
+
+    while True:
+        rows = db.session.execute(
+            select(Order.id, Order.created_at)
+            .where(Order.status.in_(statuses), Order.created_at < cutoff)
+            .order_by(Order.id)
+            .limit(batch_size)
+            # Rows being updated elsewhere wait for the next run (PostgreSQL)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if not rows:
+            break
+
+        ids_by_month = defaultdict(list)
+        for row in rows:
+            ids_by_month[row.created_at.strftime('%Y_%m')].append(row.id)
+
+        for month, order_ids in sorted(ids_by_month.items()):
+            if month not in ready:
+                _ensure_month(month)
+                ready.add(month)
+            orders, lines = archive_tables(month)
+            db.session.execute(orders.insert().from_select(
+                ORDER_FIELDS, select(*order_columns).where(Order.id.in_(order_ids))
+            ))
+            moved = db.session.execute(lines.insert().from_select(
+                LINE_FIELDS, select(*line_columns).where(OrderLine.order_id.in_(order_ids))
+            )).rowcount
+            db.session.execute(delete(OrderLine).where(OrderLine.order_id.in_(order_ids)),
+                               execution_options={'synchronize_session': False})
+            db.session.execute(delete(Order).where(Order.id.in_(order_ids)),
+                               execution_options={'synchronize_session': False})
+            db.session.execute(update(OrderArchive).where(OrderArchive.month == month).values(
+                order_count=OrderArchive.order_count + len(order_ids),
+                updated_at=datetime.utcnow(),
+            ))
+            stats['orders'] += len(order_ids)
+            stats['lines'] += moved
+            months.add(month)
+        db.session.commit()
+
+    stats['months'] = sorted(months)
+    stats['elapsed_ms'] = round((time.monotonic() - started) * 1000, 1)
+    return stats
@@ -0,0 +1,358 @@
+"""HTTP caching for catalog and blog reads, keyed on catalog_versions.
+
+Stock moves with every hold and checkout, so it does not bump the
+'products' scope. Views that show stock pass shows_stock=True instead:
+their ETags and shared-cache entries also roll over every
+RESPONSE_CACHE_STOCK_TTL seconds, which bounds how stale stock can be.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import wraps
+from itertools import chain
+
+from flask import Response, current_app, request, make_response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.carts import dialect_insert
+from app.models import BlogPost, CatalogVersion, Category, Product
+
+# Version scope bumped by writes to each model
+SCOPES_BY_MODEL = {
+    Product: 'products',
+    Category: 'categories',
+    BlogPost: 'blog',
+}
+
+
+def get_versions(scopes):
+    """Return {scope: (version, updated_at)}; unknown scopes read as version 0"""
+    rows = CatalogVersion.query.filter(CatalogVersion.scope.in_(scopes)).all()
+    found = {row.scope: (row.version, row.updated_at) for row in rows}
+    return {scope: found.get(scope, (0, None)) for scope in scopes}
+
+
+def bump_versions(connection, scopes):
+    """Increment the given scopes on an open connection, creating missing rows at version 1"""
+    table = CatalogVersion.__table__
+    now = datetime.utcnow()
+    # An upsert, so databases built without the seeded rows still get new ETags
+    stmt = dialect_insert(CatalogVersion).values(
+        [{'scope': scope, 'version': 1, 'updated_at': now} for scope in sorted(scopes)]
+    )
+    connection.execute(stmt.on_conflict_do_update(
+        index_elements=['scope'],
+        set_={'version': table.c.version + 1, 'updated_at': stmt.excluded.updated_at},
+    ))
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_on_catalog_write(session, flush_context):
+    # new/dirty/deleted still describe the pre-flush state at this point
+    scopes = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        scope = SCOPES_BY_MODEL.get(type(obj))
+        if scope and (obj not in session.dirty or session.is_modified(obj)):
+            scopes.add(scope)
+    if scopes:
+        mark_catalog_changed(session, scopes)
+
+
+def mark_catalog_changed(session, scopes):
+    """Bump scopes for writes that bypass the ORM (Core UPDATEs); once per transaction"""
+    pending = session.info.setdefault('catalog_scopes', set())
+    new_scopes = set(scopes) - pending
+    if new_scopes:
+        bump_versions(session.connection(), new_scopes)
+        pending.update(new_scopes)
+
+
+@event.listens_for(Session, 'after_flush')
+def _drop_stale_fragments(session, flush_context):
+    for obj in chain(session.dirty, session.deleted):
+        if isinstance(obj, Product):
+            product_fragments.discard(obj.id)
+        elif isinstance(obj, Category) and session.is_modified(obj):
+            # Every product embeds its category's slug and name
+            product_fragments.clear()
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_on_commit(session):
+    scopes = session.info.pop('catalog_scopes', None)
+    if scopes:
+        response_cache.invalidate(scopes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_on_rollback(session):
+    session.info.pop('catalog_scopes', None)
+
+
+def stock_window():
+    """(window seconds, current window number) for views that show stock"""
+    window = max(1, current_app.config.get('RESPONSE_CACHE_STOCK_TTL', 30))
+    return window, int(time.time() // window)
+
+
+def conditional_get(*scopes, shows_stock=False):
+    """Serve ETag / Last-Modified for a GET view whose body depends on `scopes`"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            versions = get_versions(scopes)
+            fingerprint = '|'.join(
+                f"{scope}:{versions[scope][0]}" for scope in scopes
+            )
+            stamps = [updated for _, updated in versions.values() if updated]
+            if shows_stock:
+                window, number = stock_window()
+                fingerprint += f"|stock:{number}"
+                stamps.append(datetime.utcfromtimestamp(number * window))
+            etag = hashlib.sha1(
+                f"{request.full_path}|{fingerprint}".encode()
+            ).hexdigest()
+            last_modified = (
+                max(stamps).replace(microsecond=0, tzinfo=timezone.utc)
+                if stamps else None
+            )
+
+            not_modified = False
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            elif request.if_modified_since and last_modified:
+                not_modified = last_modified <= request.if_modified_since
+
+            if not_modified:
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            if last_modified:
+                response.last_modified = last_modified
+            # Let browsers and CDNs store the body but revalidate every time
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
+
+
+class SharedCache:
+    """Response cache in a SQLite file shared by every worker on the host.
+
+    Entries expire after a TTL and the least recently used ones are evicted
+    past `max_entries`. Keys embed a per-scope token that is replaced on
+    every committed write, so invalidation is a single row update and never
+    reads the main database.
+    """
+
+    # Only refresh an entry's LRU stamp this often, to keep hits read-only
+    TOUCH_INTERVAL = 10
+
+    def __init__(self):
+        self.path = None
+        self.ttl = 300
+        self.max_entries = 1000
+        self._local = threading.local()
+
+    def init_app(self, app):
+        self.path = app.config.get('RESPONSE_CACHE_PATH') or os.path.join(
+            app.instance_path, 'response_cache.db'
+        )
+        self.ttl = app.config.get('RESPONSE_CACHE_TTL', self.ttl)
+        self.max_entries = app.config.get('RESPONSE_CACHE_MAX_ENTRIES', self.max_entries)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS entries ('
+                'key TEXT PRIMARY KEY, status INTEGER, headers TEXT, body BLOB, '
+                'expires_at REAL, accessed_at REAL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_entries_accessed_at ON entries (accessed_at)')
+            conn.execute('CREATE TABLE IF NOT EXISTS versions (scope TEXT PRIMARY KEY, token TEXT)')
+
+    def _connect(self):
+        # One connection per thread, reopened after gunicorn forks a worker
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def tokens(self, scopes):
+        conn = self._connect()
+        rows = dict(conn.execute(
+            f"SELECT scope, token FROM versions WHERE scope IN ({','.join('?' * len(scopes))})",
+            scopes
+        ).fetchall())
+        return [rows.get(scope, '') for scope in scopes]
+
+    def invalidate(self, scopes):
+        if not self.path:
+            return
+        try:
+            conn = self._connect()
+            conn.executemany(
+                'INSERT INTO versions (scope, token) VALUES (?, ?) '
+                'ON CONFLICT(scope) DO UPDATE SET token = excluded.token',
+                [(scope, uuid.uuid4().hex) for scope in scopes]
+            )
+        except sqlite3.Error as e:
+            print(f"Response cache invalidation failed: {e}")
+
+    def get(self, key):
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute(
+            'SELECT status, headers, body, expires_at, accessed_at FROM entries WHERE key = ?',
+            (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        status, headers, body, expires_at, accessed_at = row
+        if expires_at < now:
+            conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+            return None
+        if now - accessed_at > self.TOUCH_INTERVAL:
+            conn.execute('UPDATE entries SET accessed_at = ? WHERE key = ?', (now, key))
+        return status, json.loads(headers), body
+
+    def set(self, key, status, headers, body, ttl=None):
+        conn = self._connect()
+        now = time.time()
+        conn.execute(
+            'INSERT OR REPLACE INTO entries (key, status, headers, body, expires_at, accessed_at) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (key, status, json.dumps(headers), body, now + (ttl or self.ttl), now)
+        )
+        self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        conn.execute('DELETE FROM entries WHERE expires_at < ?', (now,))
+        overflow = conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0] - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                'DELETE FROM entries WHERE key IN '
+                '(SELECT key FROM entries ORDER BY accessed_at LIMIT ?)',
+                (overflow,)
+            )
+
+
+response_cache = SharedCache()
+
+# Response headers replayed on a cache hit
+CACHED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Cache-Control')
+
+
+def cached(*scopes, ttl=None, shows_stock=False):
+    """Serve a GET view from the shared response cache, keyed on its URL and `scopes`"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not response_cache.path or not current_app.config.get('RESPONSE_CACHE_ENABLED', True):
+                return view(*args, **kwargs)
+
+            entry_ttl = ttl
+            try:
+                tokens = response_cache.tokens(scopes)
+                if shows_stock:
+                    # Entries never outlive the stock window they were built in
+                    window, number = stock_window()
+                    tokens.append(f"stock:{number}")
+                    entry_ttl = min(ttl or response_cache.ttl, window)
+                key = hashlib.sha1(
+                    f"{request.full_path}|{'|'.join(tokens)}".encode()
+                ).hexdigest()
+                hit = response_cache.get(key)
+            except sqlite3.Error as e:
+                print(f"Response cache read failed: {e}")
+                return view(*args, **kwargs)
+
+            if hit:
+                status, headers, body = hit
+                response = Response(body, status=status, headers=headers)
+                # Answer If-None-Match / If-Modified-Since from the stored validators
+                return response.make_conditional(request)
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.is_streamed:
+                headers = {h: response.headers[h] for h in CACHED_HEADERS if h in response.headers}
+                try:
+                    response_cache.set(key, 200, headers, response.get_data(), entry_ttl)
+                except sqlite3.Error as e:
+                    print(f"Response cache write failed: {e}")
+            return response
+        return wrapper
+    return decorator
+
+
+class FragmentCache:
+    """Per-process LRU of pre-encoded product JSON.
+
+    Entries are keyed by (id, updated_at, category slug, category name), so a
+    fragment can never outlive the row it was built from, even when another
+    worker made the change. The flush hook above drops them early locally.
+    """
+
+    def __init__(self, max_entries=5000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, product):
+        category = product.category
+        key = (
+            product.updated_at,
+            category.slug if category else None,
+            category.name if category else None,
+        )
+        with self._lock:
+            entry = self._entries.get(product.id)
+            if entry and entry[0] == key:
+                self._entries.move_to_end(product.id)
+                return entry[1]
+
+        fragment = product.to_json_fragment()
+        with self._lock:
+            self._entries[product.id] = (key, fragment)
+            self._entries.move_to_end(product.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return fragment
+
+    def discard(self, product_id):
+        with self._lock:
+            self._entries.pop(product_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+product_fragments = FragmentCache()
+
+
+def json_array(fragments):
+    return b'[' + b','.join(fragments) + b']'
+
+
+def fragment_response(body):
+    return current_app.response_class(body, mimetype='application/json')
+
+
+def init_cache(app):
+    response_cache.init_app(app)
+    product_fragments.max_entries = app.config.get('PRODUCT_FRAGMENT_CACHE_SIZE', 5000)
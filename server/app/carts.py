@@ -0,0 +1,264 @@
+"""Cart line writes shared by the cart and order routes.
+
+Adding to a cart is a single INSERT ... ON CONFLICT DO UPDATE against the
+unique cart keys, so concurrent adds of the same product increment one
+row instead of racing to create two. RETURNING hands back the new cart
+count in the same statement.
+
+With GUEST_CART_MODE = 'cookie', guest carts skip the database entirely
+and live in a signed cookie (CookieCart) until login or checkout.
+"""
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, delete, exists, func, literal, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeSerializer
+from sqlalchemy.orm import aliased
+
+from app import db
+from app.models import CartItem, GuestCart, Product
+
+
+def dialect_insert(model):
+    # ON CONFLICT / RETURNING live on the dialect-specific insert constructs
+    if db.engine.dialect.name == 'postgresql':
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+
+def _count_other_lines(model, *conditions):
+    # Rows other than the one being written; on PostgreSQL a subquery in
+    # RETURNING does not see the statement's own insert or update
+    other = aliased(model)
+    return select(func.coalesce(func.sum(other.quantity), 0)).where(
+        *[condition(other) for condition in conditions]
+    ).scalar_subquery()
+
+
+def add_guest_line(session_id, product_id, quantity):
+    """Add quantity of a product to a guest cart; returns the cart count"""
+    stmt = dialect_insert(GuestCart).values(
+        session_id=session_id,
+        product_id=product_id,
+        quantity=quantity,
+        last_touched_at=datetime.utcnow(),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['session_id', 'product_id'],
+        set_={
+            'quantity': GuestCart.quantity + stmt.excluded.quantity,
+            'last_touched_at': stmt.excluded.last_touched_at,
+        },
+    )
+    others = _count_other_lines(
+        GuestCart,
+        lambda g: g.session_id == session_id,
+        lambda g: g.product_id != product_id,
+    )
+    return db.session.execute(stmt.returning(GuestCart.quantity + others)).scalar_one()
+
+
+def add_user_line(user_id, product, quantity):
+    """Add quantity of a product to a user's cart; returns (line id, cart count)"""
+    stmt = _merge_into_user_cart(dialect_insert(CartItem).values(
+        user_id=user_id,
+        product_id=product.id,
+        quantity=quantity,
+        added_at=datetime.utcnow(),
+    ))
+    others = _count_other_lines(
+        CartItem,
+        lambda c: c.user_id == user_id,
+        lambda c: c.product_id != product.id,
+    )
+    row = db.session.execute(stmt.returning(CartItem.id, CartItem.quantity + others)).one()
+    return row[0], row[1]
+
+
+def _merge_into_user_cart(stmt):
+    # Lines already in the user's cart absorb the incoming quantities
+    return stmt.on_conflict_do_update(
+        index_elements=['user_id', 'product_id'],
+        set_={'quantity': CartItem.quantity + stmt.excluded.quantity},
+    )
+
+
+def merge_guest_lines(user_id, session_id):
+    """Fold a guest cart into the user's cart; returns lines merged.
+
+    One INSERT ... SELECT (merging into existing lines on conflict) and one
+    bulk DELETE; the caller commits both together.
+    """
+    lines = select(
+        literal(user_id),
+        GuestCart.product_id,
+        GuestCart.quantity,
+    ).join(Product, Product.id == GuestCart.product_id).where(GuestCart.session_id == session_id)
+    db.session.execute(_merge_into_user_cart(
+        dialect_insert(CartItem).from_select(['user_id', 'product_id', 'quantity'], lines)
+    ))
+    result = db.session.execute(
+        delete(GuestCart).where(GuestCart.session_id == session_id),
+        execution_options={'synchronize_session': False},
+    )
+    return result.rowcount
+
+
+def merge_cookie_lines(user_id, lines):
+    """Fold a CookieCart's {product_id: quantity} into the user's cart"""
+    if not lines:
+        return 0
+    existing = {product_id for (product_id,) in db.session.query(Product.id).filter(Product.id.in_(lines))}
+    rows = [
+        {'user_id': user_id, 'product_id': product_id, 'quantity': quantity, 'added_at': datetime.utcnow()}
+        for product_id, quantity in lines.items() if product_id in existing
+    ]
+    if rows:
+        db.session.execute(_merge_into_user_cart(dialect_insert(CartItem).values(rows)))
+    return len(rows)
+
+
+class CookieCartLine:
+    """A rehydrated cookie cart line, shaped like GuestCart for the routes"""
+
+    def __init__(self, product, quantity):
+        # No row id: the product id addresses the line
+        self.id = product.id
+        self.product_id = product.id
+        self.product = product
+        self.quantity = quantity
+
+    def to_dict(self):
+        product = self.product
+        return {
+            'id': self.id,
+            'product_id': self.product_id,
+            'name': product.name,
+            'price': float(product.price),
+            'quantity': self.quantity,
+            'total': float(product.price * self.quantity),
+            'image': product.primary_image()
+        }
+
+
+class CookieCart:
+    """Guest cart kept client-side as signed (product_id, quantity) pairs.
+
+    Reading it costs one IN query for prices and stock; changing it writes
+    nothing to the database.
+    """
+    COOKIE_NAME = 'guest_cart'
+    # Keeps the cookie well under the 4KB browser limit
+    MAX_LINES = 50
+
+    def __init__(self, lines=None):
+        self.lines = dict(lines or {})
+
+    @staticmethod
+    def _serializer():
+        secret = current_app.config.get('GUEST_CART_SECRET') or current_app.config['SECRET_KEY']
+        return URLSafeSerializer(secret, salt='guest-cart')
+
+    @classmethod
+    def load(cls, request):
+        raw = request.cookies.get(cls.COOKIE_NAME)
+        if not raw:
+            return cls()
+        try:
+            pairs = cls._serializer().loads(raw)
+            return cls({int(product_id): int(quantity) for product_id, quantity in pairs if int(quantity) > 0})
+        except (BadSignature, TypeError, ValueError):
+            # Tampered, stale-secret or malformed cookies read as an empty cart
+            return cls()
+
+    def add(self, product_id, quantity):
+        if product_id not in self.lines and len(self.lines) >= self.MAX_LINES:
+            raise ValueError(f"Cart is limited to {self.MAX_LINES} products")
+        self.lines[product_id] = self.lines.get(product_id, 0) + quantity
+
+    def set(self, product_id, quantity):
+        self.lines[product_id] = quantity
+
+    def remove(self, product_id):
+        self.lines.pop(product_id, None)
+
+    def count(self):
+        return sum(self.lines.values())
+
+    def items(self):
+        if not self.lines:
+            return []
+        products = {p.id: p for p in Product.query.filter(Product.id.in_(self.lines))}
+        return [
+            CookieCartLine(products[product_id], quantity)
+            for product_id, quantity in self.lines.items() if product_id in products
+        ]
+
+    def save(self, response):
+        if not self.lines:
+            self.clear(response)
+            return
+        response.set_cookie(
+            self.COOKIE_NAME,
+            self._serializer().dumps([[product_id, quantity] for product_id, quantity in self.lines.items()]),
+            max_age=int(current_app.config.get('GUEST_CART_TTL_DAYS', 30) * 24 * 60 * 60),
+            httponly=True,
+            secure=True,
+            samesite='None',
+            path='/'
+        )
+
+    @classmethod
+    def clear(cls, response):
+        response.delete_cookie(cls.COOKIE_NAME, path='/', secure=True, httponly=True, samesite='None')
+
+
+def sweep_guest_carts(ttl_days, batch_size=500):
+    """Delete guest carts whose newest line is older than ttl_days.
+
+    Walks the last_touched_at index in keyset order, batch_size rows at a
+    time, committing each batch so no lock is held for the whole sweep.
+    Returns rows removed and elapsed time.
+    """
+    started = time.monotonic()
+    cutoff = datetime.utcnow() - timedelta(days=ttl_days)
+    stats = {'scanned': 0, 'deleted': 0}
+    fresh = aliased(GuestCart)
+    anchor = None
+
+    while True:
+        query = select(GuestCart.id, GuestCart.session_id, GuestCart.last_touched_at).where(
+            GuestCart.last_touched_at < cutoff
+        )
+        if anchor is not None:
+            query = query.where(or_(
+                GuestCart.last_touched_at > anchor[0],
+                and_(GuestCart.last_touched_at == anchor[0], GuestCart.id > anchor[1]),
+            ))
+        rows = db.session.execute(
+            query.order_by(GuestCart.last_touched_at, GuestCart.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        anchor = (rows[-1].last_touched_at, rows[-1].id)
+
+        # A session with any recently touched line is still live
+        sessions = {row.session_id for row in rows}
+        result = db.session.execute(
+            delete(GuestCart).where(
+                GuestCart.session_id.in_(sessions),
+                ~exists().where(
+                    fresh.session_id == GuestCart.session_id,
+                    fresh.last_touched_at >= cutoff,
+                ),
+            ),
+            execution_options={'synchronize_session': False},
+        )
+        db.session.commit()
+        stats['scanned'] += len(rows)
+        stats['deleted'] += result.rowcount
+
+    stats['elapsed_ms'] = round((time.monotonic() - started) * 1000, 1)
+    return stats
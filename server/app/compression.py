@@ -0,0 +1,171 @@
+"""WSGI middleware negotiating gzip / brotli compression of responses"""
+import re
+import zlib
+
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+COMPRESSIBLE_TYPES = {
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+    'text/css',
+    'text/html',
+    'text/plain',
+    'text/xml',
+}
+SKIP_STATUSES = {'204', '206', '304'}
+ETAG_SUFFIX_RE = re.compile(r'-(?:gzip|br)"')
+
+
+class _GzipStream:
+    def __init__(self, level):
+        # wbits=31: gzip container rather than raw zlib
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _BrotliStream:
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=min(level, 11))
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class CompressionMiddleware:
+    """Compress allow-listed responses for clients that accept it.
+
+    Responses with a Content-Length smaller than `min_size` pass through
+    untouched. Streamed responses (no Content-Length) are compressed chunk
+    by chunk with a sync flush after each one, so nothing is buffered.
+    A compressed variant gets its own ETag (`"<tag>-gzip"`); the suffix is
+    stripped from If-None-Match before the app sees it.
+    """
+
+    def __init__(self, app, min_size=500, level=6):
+        self.app = app
+        self.min_size = min_size
+        self.level = level
+
+    def negotiate(self, environ):
+        if environ.get('REQUEST_METHOD') == 'HEAD' or environ.get('HTTP_RANGE'):
+            return None
+        accepted = parse_accept_header(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        if brotli is not None and accepted.quality('br') > 0:
+            return 'br'
+        if accepted.quality('gzip') > 0:
+            return 'gzip'
+        return None
+
+    @staticmethod
+    def compressible_type(headers):
+        content_type = next((value for name, value in headers if name.lower() == 'content-type'), '')
+        return content_type.split(';', 1)[0].strip().lower() in COMPRESSIBLE_TYPES
+
+    def varies(self, status, headers):
+        # A 304 carries no Content-Type but must repeat the Vary of the 200 it stands for
+        return status.startswith('304') or self.compressible_type(headers)
+
+    @staticmethod
+    def with_vary(headers):
+        """Add Accept-Encoding to Vary, so shared caches keep plain and compressed copies apart"""
+        if any(name.lower() == 'vary' for name, _ in headers):
+            return [
+                (name, f'{value}, Accept-Encoding')
+                if name.lower() == 'vary' and 'accept-encoding' not in value.lower() else (name, value)
+                for name, value in headers
+            ]
+        return headers + [('Vary', 'Accept-Encoding')]
+
+    def should_compress(self, status, headers):
+        if status.split(' ', 1)[0] in SKIP_STATUSES:
+            return False
+        header_map = {name.lower(): value for name, value in headers}
+        if 'content-encoding' in header_map:
+            return False
+        if 'no-transform' in header_map.get('cache-control', ''):
+            return False
+        if not self.compressible_type(headers):
+            return False
+        length = header_map.get('content-length')
+        return length is None or int(length) >= self.min_size
+
+    def __call__(self, environ, start_response):
+        encoding = self.negotiate(environ)
+        if encoding is None:
+            # Plain responses vary on Accept-Encoding too, or a shared cache
+            # could hand this copy to a client that wanted gzip / br
+            def varying_start_response(status, headers, exc_info=None):
+                if self.varies(status, headers):
+                    headers = self.with_vary(headers)
+                return start_response(status, headers, exc_info)
+            return self.app(environ, varying_start_response)
+
+        # Revalidating a compressed copy: compare against the plain ETag
+        if_none_match = environ.get('HTTP_IF_NONE_MATCH', '')
+        revalidating_compressed = bool(ETAG_SUFFIX_RE.search(if_none_match))
+        if revalidating_compressed:
+            environ['HTTP_IF_NONE_MATCH'] = ETAG_SUFFIX_RE.sub('"', if_none_match)
+
+        state = {}
+
+        def compressing_start_response(status, headers, exc_info=None):
+            compress = self.should_compress(status, headers)
+            streamed = not any(name.lower() == 'content-length' for name, _ in headers)
+            if compress or (revalidating_compressed and status.startswith('304')):
+                headers = [self._rewrite(name, value, encoding) for name, value in headers]
+            if self.varies(status, headers):
+                headers = self.with_vary(headers)
+            if compress:
+                headers = [(n, v) for n, v in headers if n.lower() != 'content-length']
+                headers.append(('Content-Encoding', encoding))
+                state['compressor'] = _BrotliStream(self.level) if encoding == 'br' else _GzipStream(self.level)
+                state['streamed'] = streamed
+            return start_response(status, headers, exc_info)
+
+        app_iter = self.app(environ, compressing_start_response)
+        if 'compressor' not in state:
+            return app_iter
+        return self._compress(app_iter, state['compressor'], state['streamed'])
+
+    @staticmethod
+    def _rewrite(name, value, encoding):
+        lowered = name.lower()
+        if lowered == 'etag' and value.endswith('"'):
+            return name, f'{value[:-1]}-{encoding}"'
+        return name, value
+
+    @staticmethod
+    def _compress(app_iter, compressor, streamed):
+        try:
+            for chunk in app_iter:
+                data = compressor.compress(chunk)
+                if streamed:
+                    # Push every chunk out now instead of waiting for the end
+                    data += compressor.flush()
+                if data:
+                    yield data
+            yield compressor.finish()
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
@@ -0,0 +1,176 @@
+"""Idempotency-Key support for POST endpoints that must not run twice.
+
+The first request with a key claims it by inserting a row with no
+response yet, and commits that claim before the view runs. A retry with
+the same key then gets one of three answers:
+- 409 straight away while the first request is still in flight;
+- 422 if the key was used for a different request;
+- otherwise the first request's stored status and body.
+
+Finished responses are kept for IDEMPOTENCY_KEY_TTL_HOURS. A claim whose
+request died without finishing lapses after IDEMPOTENCY_LOCK_SECONDS.
+Server errors release the claim, so the client can retry.
+
+Keys are scoped to the signed-in user or the guest_session cart. A guest
+with neither (GUEST_CART_MODE=cookie) has no per-client scope, so the key
+is ignored rather than shared. Only the status and body are stored: a
+replay does not repeat the original headers, such as its Set-Cookie.
+"""
+import hashlib
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import Response, current_app, jsonify, make_response, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import delete, select, tuple_, update
+
+from app import db
+from app.carts import dialect_insert
+from app.models import IdempotencyKey
+from app.tasks import start_periodic
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+def _scope():
+    # Keys are per client, so one client can never replay another's response;
+    # None when the request carries no identity to scope by
+    user_id = get_jwt_identity()
+    if user_id:
+        return f'user_{user_id}'
+    session_id = request.cookies.get('guest_session')
+    return f'guest_{session_id}' if session_id else None
+
+
+def _fingerprint():
+    digest = hashlib.sha256(f'{request.method} {request.path}\n'.encode())
+    digest.update(request.get_data())
+    return digest.hexdigest()
+
+
+def _claim(scope, key, fingerprint):
+    """Take the key for this request; returns None, or the existing row's (fingerprint, status, body)"""
+    now = datetime.utcnow()
+    lapses = now + timedelta(seconds=current_app.config.get('IDEMPOTENCY_LOCK_SECONDS', 60))
+    claimed = db.session.execute(
+        dialect_insert(IdempotencyKey)
+        .values(scope=scope, idempotency_key=key, fingerprint=fingerprint, expires_at=lapses)
+        .on_conflict_do_nothing(index_elements=['scope', 'idempotency_key'])
+        .returning(IdempotencyKey.scope)
+    ).first() is not None
+    if not claimed:
+        # Expired responses and abandoned claims can be taken over
+        claimed = db.session.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.scope == scope, IdempotencyKey.idempotency_key == key,
+                   IdempotencyKey.expires_at < now)
+            .values(fingerprint=fingerprint, status_code=None, body=None, expires_at=lapses)
+        ).rowcount == 1
+    existing = None
+    if not claimed:
+        existing = db.session.execute(
+            select(IdempotencyKey.fingerprint, IdempotencyKey.status_code, IdempotencyKey.body)
+            .where(IdempotencyKey.scope == scope, IdempotencyKey.idempotency_key == key)
+        ).first()
+    db.session.commit()
+    return None if claimed else (existing or (fingerprint, None, None))
+
+
+def _release(scope, key):
+    db.session.rollback()
+    db.session.execute(delete(IdempotencyKey).where(
+        IdempotencyKey.scope == scope, IdempotencyKey.idempotency_key == key
+    ))
+    db.session.commit()
+
+
+def _store(scope, key, response):
+    ttl = timedelta(hours=current_app.config.get('IDEMPOTENCY_KEY_TTL_HOURS', 24))
+    db.session.execute(
+        update(IdempotencyKey)
+        .where(IdempotencyKey.scope == scope, IdempotencyKey.idempotency_key == key)
+        .values(status_code=response.status_code, body=response.get_data(as_text=True),
+                expires_at=datetime.utcnow() + ttl)
+    )
+    db.session.commit()
+
+
+def _answer_existing(existing, fingerprint):
+    stored_fingerprint, status_code, body = existing
+    if status_code is None:
+        response = jsonify({"error": f"A request with this {HEADER} is still in progress"})
+        response.headers['Retry-After'] = '1'
+        return response, 409
+    if stored_fingerprint != fingerprint:
+        return jsonify({"error": f"{HEADER} was already used for a different request"}), 422
+    response = Response(body, status=status_code, mimetype='application/json')
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view):
+    """Run a POST view at most once per Idempotency-Key; requests without the header
+    (or without a client identity to scope it by) are unaffected.
+
+    Goes below @jwt_required so the key can be scoped to the caller.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return jsonify({"error": f"{HEADER} is limited to {MAX_KEY_LENGTH} characters"}), 400
+        scope = _scope()
+        if scope is None:
+            return view(*args, **kwargs)
+
+        fingerprint = _fingerprint()
+        existing = _claim(scope, key, fingerprint)
+        if existing is not None:
+            return _answer_existing(existing, fingerprint)
+
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            _release(scope, key)
+            raise
+        if response.status_code >= 500:
+            _release(scope, key)
+        else:
+            _store(scope, key, response)
+        return response
+    return wrapper
+
+
+def purge_expired_keys(batch_size=1000):
+    """Delete expired keys batch_size rows at a time; returns rows removed and elapsed time"""
+    started = time.monotonic()
+    now = datetime.utcnow()
+    stats = {'deleted': 0}
+    while True:
+        expired = select(IdempotencyKey.scope, IdempotencyKey.idempotency_key).where(
+            IdempotencyKey.expires_at < now
+        ).limit(batch_size)
+        result = db.session.execute(
+            delete(IdempotencyKey).where(tuple_(IdempotencyKey.scope, IdempotencyKey.idempotency_key).in_(expired)),
+            execution_options={'synchronize_session': False},
+        )
+        db.session.commit()
+        stats['deleted'] += result.rowcount
+        if result.rowcount < batch_size:
+            break
+    stats['elapsed_ms'] = round((time.monotonic() - started) * 1000, 1)
+    return stats
+
+
+def report_purge(stats):
+    print(f"Idempotency keys: purged {stats['deleted']} expired keys in {stats['elapsed_ms']}ms")
+
+
+def init_idempotency(app):
+    # Expired keys are purged every IDEMPOTENCY_SWEEP_INTERVAL seconds (0 = never)
+    start_periodic(app, 'idempotency-keys', app.config.get('IDEMPOTENCY_SWEEP_INTERVAL'),
+                   lambda: report_purge(purge_expired_keys()))
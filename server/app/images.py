@@ -0,0 +1,143 @@
+"""Resized, WebP and placeholder derivatives for uploaded images"""
+import base64
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from PIL import Image, ImageFilter, ImageOps
+
+from app import db
+
+# Widths of the resized variants, in pixels
+DERIVATIVE_WIDTHS = (320, 640, 1024)
+DERIVATIVE_QUALITY = 80
+PLACEHOLDER_WIDTH = 16
+
+# Derivatives of <dir>/<name> live under <dir>/derived/
+DERIVED_DIRNAME = 'derived'
+
+_pool = None
+_pool_lock = threading.Lock()
+_record_lock = threading.Lock()
+
+
+def _save_atomic(image, path, fmt, **options):
+    tmp_path = path + '.tmp'
+    image.save(tmp_path, fmt, **options)
+    os.replace(tmp_path, path)
+
+
+def build_derivatives(source_path, output_dir, url_prefix, widths=DERIVATIVE_WIDTHS,
+                      quality=DERIVATIVE_QUALITY):
+    """Write resized fallback + WebP variants of one image and return its manifest.
+
+    Runs inside a pool worker, so it only touches the filesystem.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+
+    with Image.open(source_path) as original:
+        # Phone cameras store rotation in EXIF rather than in the pixels
+        image = ImageOps.exif_transpose(original)
+        has_alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    fallback_format, fallback_ext = ('PNG', 'png') if has_alpha else ('JPEG', 'jpg')
+    variants = []
+    # Never upscale: widths beyond the original collapse to the original width
+    for width in sorted({min(w, image.width) for w in widths}):
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+
+        webp_name = f"{stem}_w{width}.webp"
+        fallback_name = f"{stem}_w{width}.{fallback_ext}"
+        _save_atomic(resized, os.path.join(output_dir, webp_name), 'WEBP', quality=quality, method=4)
+        _save_atomic(resized, os.path.join(output_dir, fallback_name), fallback_format,
+                     quality=quality, optimize=True)
+        variants.append({
+            'width': width,
+            'webp': f"{url_prefix}/{webp_name}",
+            'fallback': f"{url_prefix}/{fallback_name}",
+        })
+
+    # Tiny blurred JPEG inlined as a data URI while the real image loads
+    tiny = image.convert('RGB')
+    tiny.thumbnail((PLACEHOLDER_WIDTH, PLACEHOLDER_WIDTH * 4))
+    tiny = tiny.filter(ImageFilter.GaussianBlur(1))
+    buffer = io.BytesIO()
+    tiny.save(buffer, 'JPEG', quality=40)
+    placeholder = 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode()
+
+    return {
+        'width': image.width,
+        'height': image.height,
+        'variants': variants,
+        'placeholder': placeholder,
+    }
+
+
+def derivative_paths(app, url):
+    """(source file, output dir, output url prefix) for a stored image URL"""
+    relative = url.lstrip('/')
+    url_prefix = f"{os.path.dirname(url)}/{DERIVED_DIRNAME}"
+    return (
+        os.path.join(app.root_path, relative),
+        os.path.join(app.root_path, os.path.dirname(relative), DERIVED_DIRNAME),
+        url_prefix,
+    )
+
+
+def get_pool(app):
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a threaded server process can deadlock the child
+            _pool = ProcessPoolExecutor(
+                max_workers=app.config.get('IMAGE_WORKERS', 2),
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _pool
+
+
+def record_variants(app, product_id, url, manifest):
+    """Store a derivative manifest on the product, if it still uses that image"""
+    from app.models import Product
+
+    with _record_lock, app.app_context():
+        product = db.session.get(Product, product_id)
+        if not product or url not in product.get_image_urls():
+            return False
+        variants = product.get_image_variants()
+        variants[url] = manifest
+        product.set_image_variants(variants)
+        db.session.commit()
+        return True
+
+
+def _on_derivatives_done(app, product_id, url, future):
+    try:
+        manifest = future.result()
+        if product_id is not None:
+            record_variants(app, product_id, url, manifest)
+    except Exception as e:
+        print(f"Error building derivatives for {url}: {e}")
+
+
+def schedule_derivatives(app, product_id, urls):
+    """Build derivatives for new images off the request path.
+
+    With a product_id the resulting manifests are recorded on that product;
+    blog images (product_id=None) only get the files written.
+    """
+    if not app.config.get('IMAGE_DERIVATIVES_ENABLED', True):
+        return
+    for url in urls:
+        try:
+            future = get_pool(app).submit(build_derivatives, *derivative_paths(app, url))
+        except Exception as e:
+            print(f"Error scheduling derivatives for {url}: {e}")
+            continue
+        future.add_done_callback(partial(_on_derivatives_done, app, product_id, url))
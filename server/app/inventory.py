@@ -0,0 +1,134 @@
+"""Stock reservations that cannot oversell.
+
+Every decrement is a conditional UPDATE ... WHERE stock >= :quantity, so
+concurrent checkouts serialize on the product row and the loser sees
+rowcount 0 instead of driving stock negative. Holds set stock aside for a
+cart for STOCK_HOLD_MINUTES; checkout consumes them and release_expired_holds()
+puts back the ones nobody used.
+"""
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select, update
+
+from app import db
+from app.models import Product, StockHold
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_id):
+        super().__init__(f"Insufficient stock for product {product_id}")
+        self.product_id = product_id
+
+
+def _adjust_stock(product_id, delta):
+    products = Product.__table__
+    stmt = (
+        products.update()
+        .where(products.c.id == product_id)
+        # updated_at moves so cached product JSON is rebuilt with the new stock
+        .values(stock=products.c.stock + delta, updated_at=datetime.utcnow())
+    )
+    if delta < 0:
+        stmt = stmt.where(products.c.stock >= -delta)
+    # No catalog scope bump: every checkout would queue on that one row, and
+    # cached listings pick stock up within RESPONSE_CACHE_STOCK_TTL instead
+    return db.session.execute(stmt).rowcount == 1
+
+
+def reserve_stock(product_id, quantity):
+    """Take quantity off a product's stock; raises InsufficientStock if not enough is left"""
+    if quantity > 0 and not _adjust_stock(product_id, -quantity):
+        raise InsufficientStock(product_id)
+
+
+def restock(product_id, quantity):
+    if quantity > 0:
+        _adjust_stock(product_id, quantity)
+
+
+def hold_stock(cart_key, product_id, quantity, minutes):
+    """Reserve stock for a cart until it checks out or the hold expires"""
+    reserve_stock(product_id, quantity)
+    expires_at = datetime.utcnow() + timedelta(minutes=minutes)
+    db.session.add(StockHold(cart_key=cart_key, product_id=product_id, quantity=quantity, expires_at=expires_at))
+    return expires_at
+
+
+def consume_holds(cart_key):
+    """Delete a cart's holds and return the {product_id: quantity} they had reserved"""
+    rows = db.session.execute(
+        delete(StockHold).where(StockHold.cart_key == cart_key).returning(StockHold.product_id, StockHold.quantity),
+        execution_options={'synchronize_session': False},
+    ).all()
+    held = defaultdict(int)
+    for product_id, quantity in rows:
+        held[product_id] += quantity
+    return held
+
+
+def transfer_holds(from_key, to_key):
+    """Hand a cart's holds to another cart, e.g. a guest's to the user who just signed in"""
+    db.session.execute(
+        update(StockHold).where(StockHold.cart_key == from_key).values(cart_key=to_key),
+        execution_options={'synchronize_session': False},
+    )
+
+
+def hold_cart(cart_key, lines, minutes):
+    """Re-hold a whole cart ({product_id: quantity}); raises InsufficientStock"""
+    for product_id, quantity in consume_holds(cart_key).items():
+        restock(product_id, quantity)
+    expires_at = None
+    # Fixed product order keeps concurrent multi-line reservations deadlock-free
+    for product_id, quantity in sorted(lines.items()):
+        expires_at = hold_stock(cart_key, product_id, quantity, minutes)
+    return expires_at
+
+
+def reserve_cart(cart_key, lines):
+    """Final reservation for checkout: use the cart's holds, reserve the rest.
+
+    Runs inside the caller's transaction; on InsufficientStock the caller
+    rolls back and every hold and decrement made here is undone with it.
+    """
+    held = consume_holds(cart_key) if cart_key else {}
+    for product_id, quantity in sorted(lines.items()):
+        difference = quantity - held.pop(product_id, 0)
+        if difference > 0:
+            reserve_stock(product_id, difference)
+        else:
+            restock(product_id, -difference)
+    # Held products no longer in the cart
+    for product_id, quantity in held.items():
+        restock(product_id, quantity)
+
+
+def release_expired_holds(batch_size=500):
+    """Put the stock of expired holds back, batch_size holds per transaction"""
+    started = time.monotonic()
+    stats = {'released': 0, 'units': 0}
+    while True:
+        expired = select(StockHold.id).where(StockHold.expires_at < datetime.utcnow()).order_by(
+            StockHold.expires_at
+        ).limit(batch_size)
+        # DELETE ... RETURNING: a hold consumed by a concurrent checkout is never restocked twice
+        rows = db.session.execute(
+            delete(StockHold).where(StockHold.id.in_(expired.scalar_subquery()))
+            .returning(StockHold.product_id, StockHold.quantity),
+            execution_options={'synchronize_session': False},
+        ).all()
+        if not rows:
+            db.session.rollback()
+            break
+        units = defaultdict(int)
+        for product_id, quantity in rows:
+            units[product_id] += quantity
+        for product_id, quantity in sorted(units.items()):
+            restock(product_id, quantity)
+        db.session.commit()
+        stats['released'] += len(rows)
+        stats['units'] += sum(units.values())
+    stats['elapsed_ms'] = round((time.monotonic() - started) * 1000, 1)
+    return stats
@@ -1,5 +1,7 @@
 from app import db
 from werkzeug.security import generate_password_hash
+from sqlalchemy.orm import joinedload
+from datetime import datetime
 import json
 
 class ContactMessage(db.Model):
@@ -63,14 +65,20 @@ class Category(db.Model):
 
 class Product(db.Model):
     __tablename__ = 'products'
+    __table_args__ = (
+        db.Index('ix_products_category_id_price', 'category_id', 'price'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     price = db.Column(db.Float, nullable=False)
     stock = db.Column(db.Integer, nullable=False, default=0)
     image_urls = db.Column(db.Text, nullable=True)  # Store as JSON string
+    image_variants = db.Column(db.Text, nullable=True)  # JSON: image url -> derivative manifest
     description = db.Column(db.Text)  # Added description field
-    created_at = db.Column(db.DateTime, default=db.func.now())
-    updated_at = db.Column(db.DateTime, default=db.func.now(), onupdate=db.func.now())
+    created_at = db.Column(db.DateTime, default=db.func.now(), index=True)
+    # Set in Python (UTC, like SQLite's now()) for sub-second precision, since
+    # (id, updated_at) keys the serialized fragment cache
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Foreign key to category
     category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=False)
@@ -81,71 +89,235 @@ class Product(db.Model):
     def get_image_urls(self):
         return json.loads(self.image_urls) if self.image_urls else []
 
+    def set_image_variants(self, variants):
+        self.image_variants = json.dumps(variants) if variants else None
+
+    def get_image_variants(self):
+        return json.loads(self.image_variants) if self.image_variants else {}
+
+    def srcset_for(self, url, variants):
+        """srcset-ready data for one image, or None until its derivatives exist"""
+        manifest = variants.get(url)
+        if not manifest:
+            return None
+        return {
+            'srcset': ', '.join(f"{v['fallback']} {v['width']}w" for v in manifest['variants']),
+            'webp_srcset': ', '.join(f"{v['webp']} {v['width']}w" for v in manifest['variants']),
+            'placeholder': manifest['placeholder'],
+            'width': manifest['width'],
+            'height': manifest['height']
+        }
+
+    def primary_image(self):
+        images = self.get_image_urls()
+        return images[0] if images else None
+
     def to_dict(self):
+        category = self.category
+        image_urls = self.get_image_urls()
+        variants = self.get_image_variants()
         return {
             'id': self.id,
             'name': self.name,
             'price': float(self.price),
             'stock': self.stock,
-            'image_urls': self.get_image_urls(),
+            'image_urls': image_urls,
+            'image_variants': [self.srcset_for(url, variants) for url in image_urls],
             'description': self.description,
             'category_id': self.category_id,
-            'category': self.category.slug if self.category else None,
-            'category_name': self.category.name if self.category else None,
+            'category': category.slug if category else None,
+            'category_name': category.name if category else None,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+    def to_json_fragment(self):
+        """to_dict() encoded the way jsonify would (sorted keys, compact)"""
+        return json.dumps(self.to_dict(), sort_keys=True, separators=(',', ':')).encode()
+
     def __repr__(self):
         return f"<Product {self.name}>"
 
 class Order(db.Model):
+    """Order header; totals are fixed when the order is placed"""
     __tablename__ = 'orders'
+    __table_args__ = (
+        # A user's history is one range scan; PostgreSQL also serves the listed columns from the index
+        db.Index('ix_orders_user_created', 'user_id', 'created_at',
+                 postgresql_include=['status', 'total_price', 'item_count']),
+        # Admin status filter, walked newest first without a sort
+        db.Index('ix_orders_status_id', 'status', 'id'),
+        # Ids must never be reused once the highest ones move to the archive
+        {'sqlite_autoincrement': True},
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
-    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
-    quantity = db.Column(db.Integer, nullable=False)
     total_price = db.Column(db.Float, nullable=False)
+    item_count = db.Column(db.Integer, nullable=False, default=0)
     status = db.Column(db.String(50), default='pending')
     created_at = db.Column(db.DateTime, default=db.func.now())
-    
-    # Add relationship to product
-    product = db.relationship('Product', backref='orders')
+
+    lines = db.relationship('OrderLine', backref='order', lazy=True, order_by='OrderLine.id',
+                            cascade='all, delete-orphan')
+
+    @classmethod
+    def from_cart(cls, user_id, items, status='paid'):
+        """Build an order header and its lines from cart lines (anything with product and quantity)"""
+        # Set here rather than by the server default, so the sales rollup knows the day
+        order = cls(user_id=user_id, status=status, created_at=datetime.utcnow())
+        for item in items:
+            order.lines.append(OrderLine.for_product(item.product, item.quantity))
+        order.total_price = sum(line.line_total for line in order.lines)
+        order.item_count = sum(line.quantity for line in order.lines)
+        return order
+
+    def to_dict(self, lines=None):
+        lines = self.lines if lines is None else lines
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'status': self.status,
+            'total_price': float(self.total_price),
+            'item_count': self.item_count,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'items': [line.to_dict() for line in lines]
+        }
+
+class OrderLine(db.Model):
+    """One product in an order, with name and price as they were at purchase"""
+    __tablename__ = 'order_lines'
+    __table_args__ = {'sqlite_autoincrement': True}
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    product_name = db.Column(db.String(100), nullable=False)
+    unit_price = db.Column(db.Float, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    line_total = db.Column(db.Float, nullable=False)
+
+    product = db.relationship('Product', backref='order_lines')
+
+    @classmethod
+    def for_product(cls, product, quantity):
+        return cls(product_id=product.id, product_name=product.name, unit_price=product.price,
+                   quantity=quantity, line_total=product.price * quantity)
 
     def to_dict(self):
         return {
             'id': self.id,
             'product_id': self.product_id,
-            'name': self.product.name,
-            'price': float(self.product.price),
+            'name': self.product_name,
+            'price': float(self.unit_price),
             'quantity': self.quantity,
-            'total': float(self.total_price),
-            'image': self.product.get_image_urls()[0] if self.product.get_image_urls() else None,
-            'status': self.status
+            'total': float(self.line_total)
+        }
+
+class CartItem(db.Model):
+    """A signed-in user's cart line; rows move to orders at checkout"""
+    __tablename__ = 'cart_items'
+    __table_args__ = (
+        db.Index('uq_cart_items_user_product', 'user_id', 'product_id', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False, default=1)
+    added_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    product = db.relationship('Product', backref='cart_items')
+
+    def to_dict(self):
+        product = self.product
+        return {
+            'id': self.id,
+            'product_id': self.product_id,
+            'name': product.name,
+            'price': float(product.price),
+            'quantity': self.quantity,
+            'total': float(product.price * self.quantity),
+            'image': product.primary_image()
         }
 
 class GuestCart(db.Model):
     __tablename__ = 'guest_cart'
+    __table_args__ = (
+        db.Index('uq_guest_cart_session_product', 'session_id', 'product_id', unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    session_id = db.Column(db.String(80), nullable=False, index=True)
+    session_id = db.Column(db.String(80), nullable=False)
 
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
     quantity = db.Column(db.Integer, default=1)
+    # Last add/update; sessions idle past GUEST_CART_TTL_DAYS are swept
+    last_touched_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
     product = db.relationship('Product', backref='guest_items')
 
     def to_dict(self):
+        product = self.product
         return {
             'id': self.id,
             'product_id': self.product_id,
-            'name': self.product.name,
-            'price': float(self.product.price),
+            'name': product.name,
+            'price': float(product.price),
             'quantity': self.quantity,
-            'total': float(self.product.price * self.quantity),
-            'image': self.product.get_image_urls()[0] if self.product.get_image_urls() else None
+            'total': float(product.price * self.quantity),
+            'image': product.primary_image()
         }
 
+class StockHold(db.Model):
+    """Stock set aside for a cart until checkout or expires_at"""
+    __tablename__ = 'stock_holds'
+
+    id = db.Column(db.Integer, primary_key=True)
+    cart_key = db.Column(db.String(100), nullable=False, index=True)  # 'user_<id>' or 'guest_<session>'
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class OrderArchive(db.Model):
+    """A month of archived orders, stored in orders_archive_<month> / order_lines_archive_<month>"""
+    __tablename__ = 'order_archives'
+
+    month = db.Column(db.String(7), primary_key=True)  # 'YYYY_MM' of the orders' created_at
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=db.func.now())
+    updated_at = db.Column(db.DateTime, nullable=True)
+
+class SalesDaily(db.Model):
+    """Units, revenue and orders per product per day, kept current by app.sales"""
+    __tablename__ = 'sales_daily'
+
+    day = db.Column(db.Date, primary_key=True)
+    product_id = db.Column(db.Integer, primary_key=True)
+    category_id = db.Column(db.Integer, nullable=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+
+class SalesDayTotal(db.Model):
+    """Whole-day totals; an order with several products counts once here"""
+    __tablename__ = 'sales_day_totals'
+
+    day = db.Column(db.Date, primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+
+class IdempotencyKey(db.Model):
+    """A client's Idempotency-Key and, once the request finished, its stored response"""
+    __tablename__ = 'idempotency_keys'
+
+    scope = db.Column(db.String(100), primary_key=True)  # 'user_<id>' or 'guest_<session>'
+    idempotency_key = db.Column(db.String(255), primary_key=True)
+    fingerprint = db.Column(db.String(64), nullable=False)  # sha256 of method, path and body
+    status_code = db.Column(db.Integer, nullable=True)  # NULL while the request is in flight
+    body = db.Column(db.Text, nullable=True)
+    # In flight: when the claim lapses; finished: when the stored response does
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
 class CollaborationRequest(db.Model):
     __tablename__ = 'collaboration_requests'
     id = db.Column(db.Integer, primary_key=True)
@@ -161,5 +333,27 @@ class BlogPost(db.Model):
     title = db.Column(db.String(200), nullable=False)
     thumbnail = db.Column(db.String(200))
     content = db.Column(db.Text, nullable=False)
-    date = db.Column(db.DateTime, default=db.func.now())
-    isRead = db.Column(db.Boolean, default=False)
\ No newline at end of file
+    date = db.Column(db.DateTime, default=db.func.now(), index=True)  # listed newest first
+    isRead = db.Column(db.Boolean, default=False)
+
+class CatalogVersion(db.Model):
+    __tablename__ = 'catalog_versions'
+    scope = db.Column(db.String(50), primary_key=True)  # 'products', 'categories' or 'blog'
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<CatalogVersion {self.scope}={self.version}>"
+
+# Named eager-loading profiles for listing queries, so serializing N rows
+# runs a fixed number of statements instead of one lazy load per row.
+# Built lazily because backref attributes only exist once mappers configure.
+LOAD_PROFILES = {
+    'product': lambda: (joinedload(Product.category),),
+    'cart_line': lambda: (joinedload(CartItem.product),),
+    'guest_cart_line': lambda: (joinedload(GuestCart.product),),
+}
+
+def with_profile(query, profile):
+    """Apply a named eager-loading profile to a query"""
+    return query.options(*LOAD_PROFILES[profile]())
@@ -0,0 +1,92 @@
+from flask import Blueprint, request, jsonify
+from app import db
+from app.models import Category, Product, SalesDaily, SalesDayTotal, User
+from datetime import date, datetime, timedelta
+from sqlalchemy import func, select
+from flask_jwt_extended import jwt_required, get_jwt_identity
+
+bp = Blueprint('admin', __name__)
+
+DEFAULT_STATS_DAYS = 30
+MAX_STATS_DAYS = 366
+TOP_PRODUCTS = 5
+
+# =============================
+# DASHBOARD STATS
+# =============================
+@bp.route('/admin/stats', methods=['GET'])
+@jwt_required()
+def get_stats():
+    """Sales figures for ?from=&to= (inclusive days) from the daily rollups"""
+    try:
+        user = User.query.get(get_jwt_identity())
+        if not user or not user.is_admin():
+            return jsonify({"error": "Unauthorized: Admin access required"}), 403
+
+        try:
+            end = date.fromisoformat(request.args['to']) if request.args.get('to') else datetime.utcnow().date()
+            start = (date.fromisoformat(request.args['from']) if request.args.get('from')
+                     else end - timedelta(days=DEFAULT_STATS_DAYS - 1))
+        except ValueError as e:
+            return jsonify({"error": f"Invalid date: {str(e)}"}), 400
+        if start > end:
+            return jsonify({"error": "from must not be after to"}), 400
+        # Bounded by days x products, however many orders there are
+        if (end - start).days >= MAX_STATS_DAYS:
+            return jsonify({"error": f"Range is limited to {MAX_STATS_DAYS} days"}), 400
+
+        days = db.session.execute(
+            select(SalesDayTotal.day, SalesDayTotal.order_count, SalesDayTotal.units, SalesDayTotal.revenue)
+            .where(SalesDayTotal.day.between(start, end))
+            .order_by(SalesDayTotal.day)
+        ).all()
+
+        units, revenue = func.sum(SalesDaily.units), func.sum(SalesDaily.revenue)
+        in_range = SalesDaily.day.between(start, end)
+        top_products = db.session.execute(
+            select(SalesDaily.product_id, Product.name, units, revenue)
+            .outerjoin(Product, Product.id == SalesDaily.product_id)
+            .where(in_range)
+            .group_by(SalesDaily.product_id, Product.name)
+            .having(units > 0)
+            .order_by(revenue.desc())
+            .limit(TOP_PRODUCTS)
+        ).all()
+        categories = db.session.execute(
+            select(SalesDaily.category_id, Category.name, units, revenue)
+            .outerjoin(Category, Category.id == SalesDaily.category_id)
+            .where(in_range)
+            .group_by(SalesDaily.category_id, Category.name)
+            .having(units > 0)
+            .order_by(revenue.desc())
+        ).all()
+
+        return jsonify({
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            "totals": {
+                "orders": sum(day.order_count for day in days),
+                "units": sum(day.units for day in days),
+                "revenue": round(sum(day.revenue for day in days), 2)
+            },
+            "daily": [{
+                "day": day.day.isoformat(),
+                "orders": day.order_count,
+                "units": day.units,
+                "revenue": round(day.revenue, 2)
+            } for day in days if day.order_count],
+            "top_products": [{
+                "product_id": row[0],
+                "name": row[1],
+                "units": row[2],
+                "revenue": round(row[3], 2)
+            } for row in top_products],
+            "categories": [{
+                "category_id": row[0],
+                "name": row[1],
+                "units": row[2],
+                "revenue": round(row[3], 2)
+            } for row in categories]
+        }), 200
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
@@ -1,22 +1,16 @@
-import os
 from flask import Blueprint, request, jsonify, current_app
-from werkzeug.utils import secure_filename
 from app import db
 from app.models import BlogPost
+from app.cache import cached, conditional_get
+from app.images import schedule_derivatives
+from app.uploads import allowed_file, store_upload
 from datetime import datetime
 
 bp = Blueprint('blog', __name__)
 
-# File upload configuration
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
-MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
-
-def allowed_file(filename):
-    """Check if the uploaded file has an allowed extension"""
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
-
 @bp.route('/blog', methods=['GET'])
+@cached('blog')
+@conditional_get('blog')
 def get_posts():
     """Get all blog posts"""
     posts = BlogPost.query.order_by(BlogPost.date.desc()).all()
@@ -111,16 +105,8 @@ def delete_post(id):
     post = BlogPost.query.get_or_404(id)
     
     try:
-        # If the post has a thumbnail, optionally delete the file
-        if post.thumbnail and post.thumbnail.startswith('/static/uploads/'):
-            try:
-                file_path = os.path.join(current_app.static_folder, 'uploads', 
-                                       os.path.basename(post.thumbnail))
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-            except Exception as e:
-                # Log the error but don't fail the deletion
-                print(f"Warning: Could not delete image file {post.thumbnail}: {e}")
+        # The thumbnail file is left for `flask upload gc` to reclaim once
+        # no other post or product references it
         
         db.session.delete(post)
         db.session.commit()
@@ -143,30 +129,17 @@ def upload_blog_image():
     if file.filename == '':
         return jsonify({'error': 'No file selected'}), 400
     
-    # Check file size
-    if request.content_length and request.content_length > MAX_FILE_SIZE:
-        return jsonify({'error': 'File size too large (max 5MB)'}), 400
+    # Size is enforced while the body streams in (MAX_CONTENT_LENGTH /
+    # MAX_UPLOAD_FILE_SIZE), so an oversized file never reaches this point
     
     # Validate file type and process upload
     if file and allowed_file(file.filename):
         try:
-            # Create secure filename with timestamp and blog prefix
-            original_filename = secure_filename(file.filename)
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"blog_{timestamp}_{original_filename}"
-            
-            # Use the same upload folder as your existing upload system
-            upload_folder = current_app.config.get('UPLOAD_FOLDER')
-            if not upload_folder:
-                upload_folder = os.path.join(current_app.root_path, 'static/uploads')
-                os.makedirs(upload_folder, exist_ok=True)
-            
-            # Save file
-            file_path = os.path.join(upload_folder, filename)
-            file.save(file_path)
+            # Content-addressed: identical images share one stored file
+            image_url = '/' + store_upload(file, 'blog')
             
-            # Return the URL path for the uploaded image
-            image_url = f"/static/uploads/{filename}"
+            # Resized / WebP variants are written alongside in the background
+            schedule_derivatives(current_app._get_current_object(), None, [image_url])
             
             return jsonify({
                 'message': 'Blog image uploaded successfully',
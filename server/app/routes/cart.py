@@ -1,17 +1,54 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, g, request, jsonify
 from app import db
-from app.models import GuestCart, Order, Product
+from app.models import CartItem, GuestCart, Order, Product, with_profile
+from app.carts import (
+    CookieCart, CookieCartLine, add_guest_line, add_user_line, merge_cookie_lines, merge_guest_lines, sweep_guest_carts
+)
+from app.inventory import InsufficientStock, hold_cart, release_expired_holds, reserve_cart, transfer_holds
+from app.sales import apply_order
+from app.idempotency import idempotent
+from app.tasks import start_periodic
 from flask_jwt_extended import jwt_required, get_jwt_identity, current_user
+from sqlalchemy.exc import IntegrityError
+import click
 import uuid
 
 bp = Blueprint('cart', __name__)
 
+def init_cart(app):
+    # In-process sweep of abandoned guest carts (GUEST_CART_SWEEP_INTERVAL seconds, 0 = off)
+    start_periodic(app, 'guest-cart-sweep', app.config.get('GUEST_CART_SWEEP_INTERVAL'), lambda: report_sweep(
+        sweep_guest_carts(app.config.get('GUEST_CART_TTL_DAYS', 30), app.config.get('GUEST_CART_SWEEP_BATCH', 500))
+    ))
+    # Expired stock holds go back on sale (STOCK_HOLD_SWEEP_INTERVAL seconds, 0 = off)
+    start_periodic(app, 'stock-holds', app.config.get('STOCK_HOLD_SWEEP_INTERVAL'), lambda: report_hold_release(
+        release_expired_holds()
+    ))
+
+def report_hold_release(stats):
+    print(f"Stock holds: released {stats['released']} expired holds "
+          f"({stats['units']} units) in {stats['elapsed_ms']}ms")
+
+def report_sweep(stats):
+    print(f"Guest cart sweep: scanned {stats['scanned']} idle lines, "
+          f"deleted {stats['deleted']} rows in {stats['elapsed_ms']}ms")
+
 # =============================
 # HELPER: Get cart ID
 # =============================
+def cookie_cart_mode():
+    return current_app.config.get('GUEST_CART_MODE') == 'cookie'
+
 def get_cart_id():
     if current_user:
+        # A guest cookie alongside a login means a cart still to merge
+        session_id = request.cookies.get('guest_session')
+        has_cookie_cart = CookieCart.COOKIE_NAME in request.cookies
+        if (session_id or has_cookie_cart) and not g.get('guest_cart_merged'):
+            merge_guest_to_user(current_user.id, session_id)
         return f"user_{current_user.id}"
+    if cookie_cart_mode():
+        return "cookie"
     session_id = request.cookies.get('guest_session')
     if not session_id:
         session_id = str(uuid.uuid4())
@@ -23,56 +60,67 @@ def get_cart_id():
 def get_cart_items(cart_id):
     if cart_id.startswith('user_'):
         user_id = int(cart_id.split('_')[1])
-        return Order.query.filter_by(user_id=user_id, status='pending').all()
+        return with_profile(CartItem.query, 'cart_line').filter_by(user_id=user_id).order_by(CartItem.id).all()
+    elif cart_id == 'cookie':
+        return CookieCart.load(request).items()
     else:
         session_id = cart_id.split('_', 1)[1]
-        return GuestCart.query.filter_by(session_id=session_id).all()
+        return with_profile(GuestCart.query, 'guest_cart_line').filter_by(session_id=session_id).all()
 
 # =============================
 # HELPER: Count
 # =============================
 def get_cart_count(cart_id):
-    items = get_cart_items(cart_id)
-    return sum(item.quantity for item in items)
+    if cart_id.startswith('user_'):
+        user_id = int(cart_id.split('_')[1])
+        query = db.session.query(db.func.sum(CartItem.quantity)).filter_by(user_id=user_id)
+    elif cart_id == 'cookie':
+        return CookieCart.load(request).count()
+    else:
+        session_id = cart_id.split('_', 1)[1]
+        query = db.session.query(db.func.sum(GuestCart.quantity)).filter_by(session_id=session_id)
+    return query.scalar() or 0
+
+# =============================
+# HELPER: Guest session cookie
+# =============================
+def set_guest_session_cookie(response, session_id):
+    response.set_cookie(
+        'guest_session',
+        session_id,
+        max_age=30*24*60*60,
+        httponly=True,
+        secure=True,           # ← MUST BE TRUE ON HTTPS (Render)
+        samesite='None',       # ← CRITICAL FOR CROSS-SITE
+        path='/'
+    )
 
 # =============================
 # MERGE GUEST → USER (on first access after login)
 # =============================
 def merge_guest_to_user(user_id, session_id):
-    if not session_id:
-        return
-    guest_items = GuestCart.query.filter_by(session_id=session_id).all()
-    if not guest_items:
-        return
-
-    for g in guest_items:
-        existing = Order.query.filter_by(
-            user_id=user_id,
-            product_id=g.product_id,
-            status='pending'
-        ).first()
-        if existing:
-            existing.quantity += g.quantity
-            existing.total_price = existing.product.price * existing.quantity
-        else:
-            order = Order(
-                user_id=user_id,
-                product_id=g.product_id,
-                quantity=g.quantity,
-                total_price=g.product.price * g.quantity,
-                status='pending'
-            )
-            db.session.add(order)
-        db.session.delete(g)
+    if session_id:
+        merge_guest_lines(user_id, session_id)
+        # Stock the guest reserved at checkout now counts for the user's cart
+        transfer_holds(f"guest_{session_id}", f"user_{user_id}")
+    merge_cookie_lines(user_id, CookieCart.load(request).lines)
     db.session.commit()
+    # Clearing the cookie marks the merge done; later requests skip it
+    g.guest_cart_merged = True
+
+@bp.after_request
+def clear_merged_guest_cookie(response):
+    if g.get('guest_cart_merged'):
+        response.delete_cookie('guest_session', path='/', secure=True, httponly=True, samesite='None')
+        CookieCart.clear(response)
+    return response
 
 # =============================
 # ADD TO CART
 # =============================
 @bp.route('/cart', methods=['POST'])
+@jwt_required(optional=True)
 def add_to_cart():
-    from app.models import GuestCart, Order, Product
-
     data = request.get_json()
     if not data or 'product_id' not in data:
         return jsonify({"error": "product_id required"}), 400
@@ -86,68 +134,46 @@ def add_to_cart():
     cart_id = get_cart_id()
     quantity = data.get('quantity', 1)
 
-    # === MERGE ON FIRST LOGIN ACCESS ===
-    if current_user and cart_id.startswith('guest_'):
-        session_id = cart_id.split('_', 1)[1]
-        merge_guest_to_user(current_user.id, session_id)
-        cart_id = f"user_{current_user.id}"  # Switch to user cart
-
+    # Cookie-held guest cart: no database writes at all
+    if cart_id == 'cookie':
+        cart = CookieCart.load(request)
+        try:
+            cart.add(product.id, quantity)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        response = jsonify({
+            "message": "Added to cart",
+            "cart_count": cart.count()
+        })
+        cart.save(response)
+        return response, 200
+
+    # Single upsert; duplicate clicks increment the same line
     if cart_id.startswith('user_'):
         user_id = int(cart_id.split('_')[1])
-        existing = Order.query.filter_by(user_id=user_id, product_id=product.id, status='pending').first()
-        if existing:
-            existing.quantity += quantity
-            existing.total_price = existing.product.price * existing.quantity
-        else:
-            order = Order(
-                user_id=user_id,
-                product_id=product.id,
-                quantity=quantity,
-                total_price=product.price * quantity,
-                status='pending'
-            )
-            db.session.add(order)
+        _, cart_count = add_user_line(user_id, product, quantity)
     else:
         session_id = cart_id.split('_', 1)[1]
-        existing = GuestCart.query.filter_by(session_id=session_id, product_id=product.id).first()
-        if existing:
-            existing.quantity += quantity
-        else:
-            item = GuestCart(session_id=session_id, product_id=product.id, quantity=quantity)
-            db.session.add(item)
+        cart_count = add_guest_line(session_id, product.id, quantity)
 
     db.session.commit()
 
     response = jsonify({
         "message": "Added to cart",
-        "cart_count": get_cart_count(cart_id)
+        "cart_count": cart_count
     })
     if not current_user:
-        session_id = cart_id.split('_', 1)[1]
-        response.set_cookie(
-            'guest_session',
-            session_id,
-            max_age=30*24*60*60,
-            httponly=True,
-            secure=True,           # ← MUST BE TRUE ON HTTPS (Render)
-            samesite='None',       # ← CRITICAL FOR CROSS-SITE
-            path='/'
-        )
+        set_guest_session_cookie(response, cart_id.split('_', 1)[1])
     return response, 200
 
 # =============================
 # GET CART
 # =============================
 @bp.route('/cart', methods=['GET'])
+@jwt_required(optional=True)
 def get_cart():
     cart_id = get_cart_id()
 
-    # === AUTO-MERGE ON LOGIN ===
-    if current_user and cart_id.startswith('guest_'):
-        session_id = cart_id.split('_', 1)[1]
-        merge_guest_to_user(current_user.id, session_id)
-        cart_id = f"user_{current_user.id}"
-
     items = get_cart_items(cart_id)
     return jsonify([item.to_dict() for item in items]), 200
 
@@ -155,27 +181,34 @@ def get_cart():
 # UPDATE QTY
 # =============================
 @bp.route('/cart/<int:item_id>', methods=['PUT'])
+@jwt_required(optional=True)
 def update_cart(item_id):
     cart_id = get_cart_id()
 
-    if current_user and cart_id.startswith('guest_'):
-        session_id = cart_id.split('_', 1)[1]
-        merge_guest_to_user(current_user.id, session_id)
-        cart_id = f"user_{current_user.id}"
+    data = request.get_json()
+    new_qty = data.get('quantity')
+
+    if cart_id == 'cookie':
+        # Cookie lines are addressed by product id
+        cart = CookieCart.load(request)
+        if item_id not in cart.lines:
+            return jsonify({"error": "Item not in cart"}), 404
+        if not new_qty or new_qty < 1:
+            return jsonify({"error": "Valid quantity required"}), 400
+        cart.set(item_id, new_qty)
+        response = jsonify({"message": "Updated"})
+        cart.save(response)
+        return response, 200
 
     items = get_cart_items(cart_id)
     item = next((i for i in items if i.id == item_id), None)
     if not item:
         return jsonify({"error": "Item not in cart"}), 404
 
-    data = request.get_json()
-    new_qty = data.get('quantity')
     if not new_qty or new_qty < 1:
         return jsonify({"error": "Valid quantity required"}), 400
 
     item.quantity = new_qty
-    if hasattr(item, 'total_price'):
-        item.total_price = item.product.price * new_qty
     db.session.commit()
 
     return jsonify({"message": "Updated"}), 200
@@ -184,13 +217,18 @@ def update_cart(item_id):
 # REMOVE ITEM
 # =============================
 @bp.route('/cart/<int:item_id>', methods=['DELETE'])
+@jwt_required(optional=True)
 def remove_from_cart(item_id):
     cart_id = get_cart_id()
 
-    if current_user and cart_id.startswith('guest_'):
-        session_id = cart_id.split('_', 1)[1]
-        merge_guest_to_user(current_user.id, session_id)
-        cart_id = f"user_{current_user.id}"
+    if cart_id == 'cookie':
+        cart = CookieCart.load(request)
+        if item_id not in cart.lines:
+            return jsonify({"error": "Not found"}), 404
+        cart.remove(item_id)
+        response = jsonify({"message": "Removed"})
+        cart.save(response)
+        return response, 200
 
     items = get_cart_items(cart_id)
     item = next((i for i in items if i.id == item_id), None)
@@ -201,19 +239,122 @@ def remove_from_cart(item_id):
     db.session.commit()
     return jsonify({"message": "Removed"}), 200
 
+# =============================
+# BATCH UPDATE
+# =============================
+CART_OPERATIONS = ('add', 'set', 'remove')
+
+def parse_cart_operations(operations):
+    """Validate a PATCH body's operations into (op, product_id, quantity) tuples"""
+    if not isinstance(operations, list) or not operations:
+        raise ValueError("operations must be a non-empty list")
+    parsed = []
+    for operation in operations:
+        if not isinstance(operation, dict) or operation.get('op') not in CART_OPERATIONS:
+            raise ValueError(f"op must be one of {', '.join(CART_OPERATIONS)}")
+        try:
+            product_id = int(operation['product_id'])
+            quantity = int(operation.get('quantity', 1 if operation['op'] == 'add' else 0))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("Each operation needs an integer product_id (and quantity)")
+        if quantity < 0 or (operation['op'] == 'add' and quantity < 1):
+            raise ValueError("Valid quantity required")
+        parsed.append((operation['op'], product_id, quantity))
+    return parsed
+
+@bp.route('/cart', methods=['PATCH'])
+@jwt_required(optional=True)
+def patch_cart():
+    """Apply add / set / remove operations (by product_id) all-or-nothing"""
+    data = request.get_json(silent=True) or {}
+    try:
+        operations = parse_cart_operations(data.get('operations'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    cart_id = get_cart_id()
+    if cart_id == 'cookie':
+        cart = CookieCart.load(request)
+        quantities = dict(cart.lines)
+    else:
+        lines = {line.product_id: line for line in get_cart_items(cart_id)}
+        quantities = {product_id: line.quantity for product_id, line in lines.items()}
+
+    # One lookup covers every product the batch touches or the cart will hold
+    product_ids = {product_id for _, product_id, _ in operations} | set(quantities)
+    products = {p.id: p for p in Product.query.filter(Product.id.in_(product_ids))}
+
+    for op, product_id, quantity in operations:
+        if op != 'remove' and product_id not in products:
+            return jsonify({"error": f"Product {product_id} not found"}), 404
+        if op == 'add':
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+        elif op == 'set' and quantity > 0:
+            quantities[product_id] = quantity
+        else:
+            quantities.pop(product_id, None)
+
+    touched = {product_id for _, product_id, _ in operations}
+    for product_id in touched & set(quantities):
+        if quantities[product_id] > products[product_id].stock:
+            return jsonify({"error": f"Insufficient stock for {products[product_id].name}"}), 400
+
+    if cart_id == 'cookie':
+        if len(quantities) > CookieCart.MAX_LINES:
+            return jsonify({"error": f"Cart is limited to {CookieCart.MAX_LINES} products"}), 400
+        cart.lines = {product_id: quantity for product_id, quantity in quantities.items() if product_id in products}
+        items = [CookieCartLine(products[product_id], quantity) for product_id, quantity in cart.lines.items()]
+        response = jsonify({
+            "items": [item.to_dict() for item in items],
+            "cart_count": cart.count()
+        })
+        cart.save(response)
+        return response, 200
+
+    try:
+        items = []
+        for product_id, line in lines.items():
+            if product_id not in quantities:
+                db.session.delete(line)
+        for product_id, quantity in quantities.items():
+            product = products[product_id]
+            line = lines.get(product_id)
+            if line is None:
+                if cart_id.startswith('user_'):
+                    line = CartItem(user_id=int(cart_id.split('_')[1]), product=product, quantity=quantity)
+                else:
+                    line = GuestCart(session_id=cart_id.split('_', 1)[1], product=product, quantity=quantity)
+                db.session.add(line)
+            elif line.quantity != quantity:
+                line.quantity = quantity
+            items.append(line)
+
+        # Serialize before commit expires the lines
+        db.session.flush()
+        result = [item.to_dict() for item in items]
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent request changed the same cart lines
+        db.session.rollback()
+        return jsonify({"error": "Cart changed concurrently, please retry"}), 409
+
+    response = jsonify({
+        "items": result,
+        "cart_count": sum(quantities.values())
+    })
+    if not current_user:
+        set_guest_session_cookie(response, cart_id.split('_', 1)[1])
+    return response, 200
+
 # =============================
 # CHECKOUT
 # =============================
 @bp.route('/checkout', methods=['POST'])
 @jwt_required(optional=True)
+@idempotent
 def checkout():
     cart_id = get_cart_id()
 
-    if current_user and cart_id.startswith('guest_'):
-        session_id = cart_id.split('_', 1)[1]
-        merge_guest_to_user(current_user.id, session_id)
-        cart_id = f"user_{current_user.id}"
-
     items = get_cart_items(cart_id)
     if not items:
         return jsonify({"error": "Cart is empty"}), 400
@@ -222,17 +363,85 @@ def checkout():
     shipping = data.get('shipping', {})
     payment_method = data.get('payment_method', 'cod')
 
-    # Change status to 'paid'
+    # Reserve every line in this transaction, or none of them
+    lines = {}
     for item in items:
-        item.status = 'paid'
-        # Optionally save shipping info elsewhere
+        lines[item.product_id] = lines.get(item.product_id, 0) + item.quantity
+    try:
+        reserve_cart(None if cart_id == 'cookie' else cart_id, lines)
+    except InsufficientStock as e:
+        db.session.rollback()
+        return jsonify({"error": "Insufficient stock", "product_id": e.product_id}), 409
+
+    # The cart becomes one paid order (user_id NULL for guests) and is emptied
+    order = Order.from_cart(current_user.id if current_user else None, items)
+    db.session.add(order)
+    apply_order(order)
+    if cart_id != 'cookie':
+        for item in items:
+            db.session.delete(item)
+    # Optionally save shipping info elsewhere
+    db.session.flush()
+    order_id, total_price = order.id, float(order.total_price)
     db.session.commit()
 
     # Clear guest cookie
     response = jsonify({
         "message": "Order placed successfully",
-        "order_id": items[0].id  # or create a parent order
+        "order_id": order_id,
+        "total_price": total_price
     })
     if not current_user:
         response.set_cookie('guest_session', '', expires=0)
-    return response, 200
\ No newline at end of file
+        CookieCart.clear(response)
+    return response, 200
+
+# =============================
+# STOCK HOLDS
+# =============================
+@bp.route('/checkout/reserve', methods=['POST'])
+@jwt_required(optional=True)
+def reserve_checkout():
+    """Hold stock for the whole cart while the buyer fills in checkout"""
+    cart_id = get_cart_id()
+    if cart_id == 'cookie':
+        return jsonify({"error": "Stock holds need a server-side cart"}), 400
+
+    lines = {}
+    for item in get_cart_items(cart_id):
+        lines[item.product_id] = lines.get(item.product_id, 0) + item.quantity
+    if not lines:
+        return jsonify({"error": "Cart is empty"}), 400
+
+    try:
+        expires_at = hold_cart(cart_id, lines, current_app.config.get('STOCK_HOLD_MINUTES', 15))
+    except InsufficientStock as e:
+        db.session.rollback()
+        return jsonify({"error": "Insufficient stock", "product_id": e.product_id}), 409
+    db.session.commit()
+    return jsonify({"message": "Stock reserved", "expires_at": expires_at.isoformat()}), 200
+
+# =============================
+# SWEEP ABANDONED GUEST CARTS
+# =============================
+@bp.cli.command('sweep')
+@click.option('--days', type=float, default=None,
+              help='Delete guest carts idle longer than this (default GUEST_CART_TTL_DAYS).')
+@click.option('--batch-size', type=int, default=None,
+              help='Rows examined per transaction (default GUEST_CART_SWEEP_BATCH).')
+def sweep_carts(days, batch_size):
+    """Delete abandoned guest carts."""
+    if days is None:
+        days = current_app.config.get('GUEST_CART_TTL_DAYS', 30)
+    if batch_size is None:
+        batch_size = current_app.config.get('GUEST_CART_SWEEP_BATCH', 500)
+    report_sweep(sweep_guest_carts(days, batch_size))
+
+# =============================
+# RELEASE EXPIRED STOCK HOLDS
+# =============================
+@bp.cli.command('release-holds')
+@click.option('--batch-size', type=int, default=500, help='Holds released per transaction.')
+def release_holds(batch_size):
+    """Return the stock of expired checkout holds."""
+    report_hold_release(release_expired_holds(batch_size))
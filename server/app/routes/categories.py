@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from app import db
 from app.models import Category, User
+from app.cache import cached, conditional_get
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 bp = Blueprint('categories', __name__)
@@ -19,6 +20,8 @@ def initialize_default_categories():
     db.session.commit()
 
 @bp.route('/categories', methods=['GET'])
+@cached('categories')
+@conditional_get('categories')
 def get_categories():
     try:
         categories = Category.query.all()
@@ -1,11 +1,36 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
 from app import db
-from app.models import Order, Product, User, GuestCart
+from app.models import Order, Product, User
+from app.archive import archive_months, archive_orders, line_history, order_history
+from app.carts import CookieCart, add_guest_line, add_user_line
+from app.inventory import InsufficientStock, hold_stock
+from app.sales import rebuild_sales, status_change
+from app.idempotency import idempotent
+from app.tasks import start_periodic
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_, select
+import base64
+import click
+import json
 import uuid
 from flask_jwt_extended import jwt_required, get_jwt_identity, create_access_token 
 
 bp = Blueprint('orders', __name__)
 
+def init_orders(app):
+    # Periodic order archival (ORDER_ARCHIVE_INTERVAL seconds, 0 = CLI only)
+    start_periodic(app, 'order-archive', app.config.get('ORDER_ARCHIVE_INTERVAL'), lambda: report_archive(
+        archive_orders(app.config.get('ORDER_ARCHIVE_AFTER_DAYS', 180), archive_statuses(app.config),
+                       app.config.get('ORDER_ARCHIVE_BATCH', 500))
+    ))
+
+def archive_statuses(config):
+    return [s for s in config.get('ORDER_ARCHIVE_STATUSES', 'completed,cancelled').split(',') if s]
+
+def report_archive(stats):
+    print(f"Order archive: moved {stats['orders']} orders ({stats['lines']} lines) "
+          f"into {', '.join(stats['months']) or 'no months'} in {stats['elapsed_ms']}ms")
+
 # =============================
 # 1. GUEST CART (NO LOGIN)
 # =============================
@@ -25,29 +50,32 @@ def add_to_guest_cart():
         if product.stock < quantity:
             return jsonify({"error": "Insufficient stock"}), 400
 
+        # Cookie-held guest cart: no database writes
+        if current_app.config.get('GUEST_CART_MODE') == 'cookie':
+            cart = CookieCart.load(request)
+            try:
+                cart.add(product.id, quantity)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            response = jsonify({
+                "message": "Added to cart (guest)",
+                "cart_count": cart.count()
+            })
+            cart.save(response)
+            return response, 200
+
         # Generate or get session ID (like a guest ID)
         session_id = request.cookies.get('guest_session')
         if not session_id:
             session_id = str(uuid.uuid4())
         
-        # Check if item already in guest cart
-        existing = GuestCart.query.filter_by(session_id=session_id, product_id=product_id).first()
-        if existing:
-            existing.quantity += quantity
-        else:
-            guest_item = GuestCart(
-                session_id=session_id,
-                product_id=product_id,
-                quantity=quantity
-            )
-            db.session.add(guest_item)
-        
+        cart_count = add_guest_line(session_id, product_id, quantity)
         db.session.commit()
 
         # Set cookie (expires in 30 days)
         response = jsonify({
             "message": "Added to cart (guest)",
-            "cart_count": get_guest_cart_count(session_id)
+            "cart_count": cart_count
         })
         response.set_cookie('guest_session', session_id, max_age=30*24*60*60, httponly=True)
         return response, 200
@@ -58,6 +86,7 @@ def add_to_guest_cart():
 
 @bp.route('/orders', methods=['POST'])
 @jwt_required()
+@idempotent
 def create_order():
     try:
         current_user_id = get_jwt_identity()
@@ -76,26 +105,112 @@ def create_order():
             return jsonify({"error": "Insufficient stock"}), 400
 
         total_price = product.price * data['quantity']
-        new_order = Order(
-            user_id=current_user_id,
-            product_id=data['product_id'],
-            quantity=data['quantity'],
-            total_price=total_price,
-            status='pending'
-        )
-        product.stock -= data['quantity']
-        db.session.add(new_order)
+        # Stock is held for the cart rather than decremented for good;
+        # checkout consumes the hold, expiry puts the stock back
+        try:
+            hold_stock(f"user_{current_user_id}", product.id, data['quantity'],
+                       current_app.config.get('STOCK_HOLD_MINUTES', 15))
+        except InsufficientStock:
+            db.session.rollback()
+            return jsonify({"error": "Insufficient stock"}), 400
+        order_id, _ = add_user_line(int(current_user_id), product, data['quantity'])
         db.session.commit()
 
         return jsonify({
             "message": "Item added to cart!",
-            "id": new_order.id,
+            "id": order_id,
             "total_price": total_price
         }), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
+# Admin order listing
+ORDER_STREAM_BATCH = 500
+MAX_ORDER_PAGE_SIZE = 500
+
+def parse_order_filters(args):
+    """Status / date range / user filters for the admin listing; raises ValueError"""
+    filters = {
+        'statuses': [s for s in args.get('status', '').split(',') if s],
+        'user_id': int(args['user_id']) if args.get('user_id') else None,
+        'start': datetime.fromisoformat(args['from']) if args.get('from') else None,
+        'end': None,
+        'end_inclusive': True,
+        'include_archived': args.get('archived', 'true').lower() != 'false',
+    }
+    if args.get('to'):
+        filters['end'] = datetime.fromisoformat(args['to'])
+        # A bare date means the whole day
+        if len(args['to']) == 10:
+            filters['end'] += timedelta(days=1)
+            filters['end_inclusive'] = False
+    return filters
+
+def order_filter_conditions(filters, table):
+    """WHERE clauses for orders or one of its archive tables"""
+    conditions = []
+    if filters['statuses']:
+        conditions.append(table.c.status.in_(filters['statuses']))
+    if filters['user_id'] is not None:
+        conditions.append(table.c.user_id == filters['user_id'])
+    if filters['start'] is not None:
+        conditions.append(table.c.created_at >= filters['start'])
+    if filters['end'] is not None:
+        conditions.append(table.c.created_at <= filters['end'] if filters['end_inclusive']
+                          else table.c.created_at < filters['end'])
+    return conditions
+
+def encode_order_cursor(order_id):
+    return base64.urlsafe_b64encode(str(order_id).encode()).decode().rstrip('=')
+
+def decode_order_cursor(cursor):
+    try:
+        return int(base64.urlsafe_b64decode((cursor + '=' * (-len(cursor) % 4)).encode()))
+    except (ValueError, UnicodeDecodeError, base64.binascii.Error):
+        raise ValueError('Invalid cursor')
+
+def lines_by_order(rows):
+    """Line dicts for a batch of order headers, in one query over the tables they live in.
+
+    Keyed by (archive_month, order id), so a header only ever gets the lines
+    from its own table.
+    """
+    lines = {(row.archive_month, row.id): [] for row in rows}
+    if not rows:
+        return lines
+    ids_by_month = {}
+    for row in rows:
+        ids_by_month.setdefault(row.archive_month, []).append(row.id)
+    for row in db.session.execute(line_history(ids_by_month)):
+        lines[(row.archive_month, row.order_id)].append({
+            'id': row.id,
+            'product_id': row.product_id,
+            'name': row.product_name,
+            'price': float(row.unit_price),
+            'quantity': row.quantity,
+            'total': float(row.line_total)
+        })
+    return lines
+
+def order_row_to_dict(row, lines):
+    return {
+        'id': row.id,
+        'user_id': row.user_id,
+        # product_name / quantity summarise the lines for the admin tables
+        'product_name': ', '.join(line['name'] for line in lines),
+        'quantity': row.item_count,
+        'item_count': row.item_count,
+        'total_price': float(row.total_price),
+        'status': row.status,
+        'created_at': row.created_at.isoformat() if row.created_at else None,
+        'items': lines
+    }
+
+def serialize_orders(rows):
+    lines = lines_by_order(rows)
+    return [order_row_to_dict(row, lines[(row.archive_month, row.id)]) for row in rows]
+
 @bp.route('/orders', methods=['GET'])
 @jwt_required()
 def get_orders():
@@ -105,17 +220,50 @@ def get_orders():
         if not user or not user.is_admin():
             return jsonify({"error": "Unauthorized: Admin access required"}), 403
 
-        orders = Order.query.all()
-        return jsonify([{
-            'id': o.id,
-            'user_id': o.user_id,
-            'product_id': o.product_id,
-            'product_name': o.product.name,
-            'quantity': o.quantity,
-            'total_price': float(o.total_price),
-            'status': o.status,
-            'created_at': o.created_at.isoformat()
-        } for o in orders]), 200
+        try:
+            filters = parse_order_filters(request.args)
+            last_id = decode_order_cursor(request.args['cursor']) if request.args.get('cursor') else None
+            limit = int(request.args['limit']) if request.args.get('limit') else None
+        except ValueError as e:
+            return jsonify({"error": f"Invalid filter: {str(e)}"}), 400
+
+        def conditions(table):
+            clauses = order_filter_conditions(filters, table)
+            # Newest first, keyed on id
+            if last_id is not None:
+                clauses.append(table.c.id < last_id)
+            return clauses
+
+        # Plain header rows rather than ORM objects: nothing accumulates per row.
+        # Archived months are included unless ?archived=false
+        months = archive_months(filters['start'], filters['end']) if filters['include_archived'] else []
+        history = order_history(conditions, months)
+        query = select(history).order_by(history.c.id.desc())
+
+        # Paged: bounded by limit, with a cursor for the next page
+        if limit is not None:
+            limit = max(1, min(limit, MAX_ORDER_PAGE_SIZE))
+            rows = db.session.execute(query.limit(limit + 1)).all()
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            return jsonify({
+                "orders": serialize_orders(rows),
+                "next_cursor": encode_order_cursor(rows[-1].id) if has_more else None,
+                "has_more": has_more
+            }), 200
+
+        # Unpaged: stream the whole JSON array in server-side batches,
+        # loading each batch's lines with one IN query
+        def generate():
+            yield '['
+            first = True
+            result = db.session.execute(query.execution_options(yield_per=ORDER_STREAM_BATCH))
+            for rows in result.partitions():
+                yield ('' if first else ',') + ','.join(json.dumps(order) for order in serialize_orders(rows))
+                first = False
+            yield ']'
+
+        return Response(stream_with_context(generate()), mimetype='application/json'), 200
     except Exception as e:
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
@@ -135,6 +283,8 @@ def update_order_status(order_id):
         if data['status'] not in ['pending', 'completed', 'cancelled']:
             return jsonify({"error": "Invalid status"}), 400
 
+        # The daily sales rollup changes in the same transaction
+        status_change(order, data['status'])
         order.status = data['status']
         db.session.commit()
         return jsonify({
@@ -144,4 +294,84 @@ def update_order_status(order_id):
         }), 200
     except Exception as e:
         db.session.rollback()
-        return jsonify({"error": f"Server error: {str(e)}"}), 500
\ No newline at end of file
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+# =============================
+# ORDER HISTORY (SIGNED-IN USER)
+# =============================
+DEFAULT_HISTORY_PAGE_SIZE = 20
+MAX_HISTORY_PAGE_SIZE = 50
+
+@bp.route('/me/orders', methods=['GET'])
+@jwt_required()
+def get_my_orders():
+    try:
+        user_id = int(get_jwt_identity())
+        try:
+            limit = max(1, min(int(request.args.get('limit', DEFAULT_HISTORY_PAGE_SIZE)), MAX_HISTORY_PAGE_SIZE))
+            last_id = decode_order_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        except ValueError as e:
+            return jsonify({"error": f"Invalid parameter: {str(e)}"}), 400
+
+        months = archive_months()
+        anchor = None
+        if last_id is not None:
+            # Compare against the stored timestamp, not a re-bound copy of it;
+            # the cursor's order may since have moved to the archive
+            placed = order_history(lambda table: [table.c.id == last_id, table.c.user_id == user_id], months)
+            # A CTE, so the lookup runs once rather than in every UNION branch
+            anchor = select(select(placed.c.created_at).cte('cursor_anchor')).scalar_subquery()
+
+        def conditions(table):
+            clauses = [table.c.user_id == user_id]
+            if anchor is not None:
+                clauses.append(or_(
+                    table.c.created_at < anchor,
+                    and_(table.c.created_at == anchor, table.c.id < last_id)
+                ))
+            return clauses
+
+        # Newest first along ix_orders_user_created and its archive counterparts
+        history = order_history(conditions, months)
+        query = select(history).order_by(history.c.created_at.desc(), history.c.id.desc()).limit(limit + 1)
+
+        rows = db.session.execute(query).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return jsonify({
+            "orders": serialize_orders(rows),
+            "next_cursor": encode_order_cursor(rows[-1].id) if has_more else None,
+            "has_more": has_more
+        }), 200
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+# =============================
+# ARCHIVE OLD ORDERS
+# =============================
+@bp.cli.command('archive')
+@click.option('--days', type=float, default=None,
+              help='Archive orders placed longer ago than this (default ORDER_ARCHIVE_AFTER_DAYS).')
+@click.option('--batch-size', type=int, default=None,
+              help='Orders moved per transaction (default ORDER_ARCHIVE_BATCH).')
+def archive_old_orders(days, batch_size):
+    """Move old finished orders into the monthly archive tables."""
+    if days is None:
+        days = current_app.config.get('ORDER_ARCHIVE_AFTER_DAYS', 180)
+    if batch_size is None:
+        batch_size = current_app.config.get('ORDER_ARCHIVE_BATCH', 500)
+    report_archive(archive_orders(days, archive_statuses(current_app.config), batch_size))
+
+# =============================
+# REBUILD SALES ROLLUPS
+# =============================
+@bp.cli.command('rebuild-sales')
+@click.option('--from', 'start', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='First day to rebuild (default: all history).')
+@click.option('--to', 'end', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Last day to rebuild, inclusive (default: today).')
+def rebuild_sales_rollups(start, end):
+    """Recompute the daily sales rollups from the order tables."""
+    stats = rebuild_sales(start and start.date(), end and end.date())
+    print(f"Sales rollup: rebuilt {stats['days']} days ({stats['product_days']} product rows) "
+          f"in {stats['elapsed_ms']}ms")
@@ -1,66 +1,238 @@
 from flask import Blueprint, request, jsonify, current_app
-from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
 import os
-import uuid
+import json
+import base64
+from concurrent.futures import as_completed
+from datetime import datetime
 from app import db
-from app.models import Product, Category
+from app.models import Product, Category, with_profile
+from app.cache import cached, conditional_get, fragment_response, json_array, product_fragments
+from app.uploads import store_upload
+from app.images import schedule_derivatives, build_derivatives, derivative_paths, get_pool, record_variants
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 
 bp = Blueprint('products', __name__)
 
-# Helper function for file uploads
-def allowed_file(filename):
-    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+# Listing page size
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
 
+# Helper function for file uploads
 def save_uploaded_file(file):
-    """Save uploaded file and return the full URL"""
-    if file and allowed_file(file.filename):
-        filename = str(uuid.uuid4()) + '_' + secure_filename(file.filename)
-        upload_dir = os.path.join(current_app.root_path,'static', 'uploads', 'products')
-        os.makedirs(upload_dir, exist_ok=True)
-        filepath = os.path.join(upload_dir, filename)
-        try:
-            file.save(filepath)
-            print(f"File saved to {filepath}")  # Debug log
-            # Use environment variable or default to local URL
-            return f'static/uploads/products/{filename}'
-        except Exception as e:
-            print(f"Error saving file: {e}")
-            return None
-    return None
+    """Store an uploaded product image and return its URL"""
+    try:
+        return store_upload(file, 'products')
+    except OSError as e:
+        print(f"Error saving file: {e}")
+        return None
+
+# Listing sort orders: name -> (column, descending)
+SORT_OPTIONS = {
+    'newest': (Product.created_at, True),
+    'price_asc': (Product.price, False),
+    'price_desc': (Product.price, True),
+    'name': (Product.name, False),
+}
+
+# Upper bounds of the price facet buckets; the last bucket is open-ended
+PRICE_BUCKETS = [50, 100, 200]
+
+# Helpers for keyset pagination
+def encode_cursor(product, sort):
+    """Encode the (sort key, id) position of a product as an opaque cursor; a NULL key is encoded as null"""
+    column, _ = SORT_OPTIONS[sort]
+    value = getattr(product, column.key)
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps([sort, value, product.id])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, sort):
+    """Decode a cursor back into (sort value, id), raising ValueError if malformed"""
+    padded = cursor + '=' * (-len(cursor) % 4)
+    try:
+        cursor_sort, value, product_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if cursor_sort != sort:
+            raise ValueError('Cursor belongs to a different sort order')
+        if sort == 'newest' and value is not None:
+            value = datetime.fromisoformat(value)
+        return value, int(product_id)
+    except (TypeError, ValueError, UnicodeDecodeError, base64.binascii.Error):
+        raise ValueError('Invalid cursor')
+
+def price_bucket_expression():
+    """SQL CASE mapping a product's price to its PRICE_BUCKETS index"""
+    whens = [(Product.price < bound, index) for index, bound in enumerate(PRICE_BUCKETS)]
+    return db.case(*whens, else_=len(PRICE_BUCKETS))
+
+def parse_listing_filters(args):
+    """Read facet filters from the query string, raising ValueError on bad input"""
+    min_price = args.get('min_price', type=float)
+    max_price = args.get('max_price', type=float)
+    if args.get('min_price') and min_price is None or args.get('max_price') and max_price is None:
+        raise ValueError('Invalid price range')
+
+    category_ids = []
+    slugs = [slug for slug in args.get('category', '').split(',') if slug]
+    if slugs:
+        categories = Category.query.filter(Category.slug.in_(slugs)).all()
+        category_ids = [category.id for category in categories]
+
+    return {
+        'category_ids': category_ids,
+        'min_price': min_price,
+        'max_price': max_price,
+        'in_stock': args.get('in_stock', 'false').lower() == 'true',
+    }
+
+def price_in_range(filters):
+    conditions = []
+    if filters['min_price'] is not None:
+        conditions.append(Product.price >= filters['min_price'])
+    if filters['max_price'] is not None:
+        conditions.append(Product.price <= filters['max_price'])
+    return db.and_(db.true(), *conditions)
+
+def apply_listing_filters(query, filters):
+    if filters['category_ids']:
+        query = query.filter(Product.category_id.in_(filters['category_ids']))
+    if filters['in_stock']:
+        query = query.filter(Product.stock > 0)
+    return query.filter(price_in_range(filters))
+
+def compute_facets(filters):
+    """Category, price bucket and in-stock counts from one aggregate query.
+
+    Rows are grouped by every facet dimension plus whether they pass the
+    price range, and each facet is then folded ignoring its own filter, so
+    selecting a category still shows counts for the others.
+    """
+    bucket = price_bucket_expression()
+    in_stock = db.case((Product.stock > 0, 1), else_=0)
+    in_range = db.case((price_in_range(filters), 1), else_=0)
+    rows = db.session.query(
+        Category.id, Category.slug, Category.name,
+        bucket, in_stock, in_range, db.func.count(Product.id)
+    ).join(Category, Product.category_id == Category.id).group_by(
+        Category.id, Category.slug, Category.name, bucket, in_stock, in_range
+    ).all()
+
+    selected = set(filters['category_ids'])
+    categories = {}
+    buckets = [0] * (len(PRICE_BUCKETS) + 1)
+    in_stock_count = 0
+    for category_id, slug, name, bucket_index, has_stock, priced, count in rows:
+        category_ok = not selected or category_id in selected
+        stock_ok = has_stock or not filters['in_stock']
+        entry = categories.setdefault(category_id, {'id': category_id, 'slug': slug, 'name': name, 'count': 0})
+        if priced and stock_ok:
+            entry['count'] += count
+        if category_ok and stock_ok:
+            buckets[bucket_index] += count
+        if category_ok and priced and has_stock:
+            in_stock_count += count
+
+    bounds = [0] + PRICE_BUCKETS + [None]
+    return {
+        'categories': sorted(categories.values(), key=lambda c: c['name']),
+        'price_buckets': [
+            {'min': bounds[i], 'max': bounds[i + 1], 'count': buckets[i]}
+            for i in range(len(buckets))
+        ],
+        'in_stock': in_stock_count,
+    }
 
 # Get all products
 @bp.route('/products', methods=['GET'])
+@cached('products', 'categories', shows_stock=True)
+@conditional_get('products', 'categories', shows_stock=True)
 def get_products():
     try:
         # Get query parameters
-        category_slug = request.args.get('category')
+        return_all = request.args.get('all', 'false').lower() == 'true'
+        sort = request.args.get('sort', 'newest')
+        if sort not in SORT_OPTIONS:
+            return jsonify({'error': f"Invalid sort (use one of {', '.join(SORT_OPTIONS)})"}), 400
+        try:
+            filters = parse_listing_filters(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Base query
-        query = Product.query
+        # Base query with price, stock and category filters
+        query = apply_listing_filters(with_profile(Product.query, 'product'), filters)
         
-        # Filter by category if provided
-        if category_slug:
-            category = Category.query.filter_by(slug=category_slug).first()
-            if category:
-                query = query.filter_by(category_id=category.id)
+        column, descending = SORT_OPTIONS[sort]
+        order_by = [column.desc(), Product.id.desc()] if descending else [column.asc(), Product.id.asc()]
+        # Rows without a sort key (created_at set outside the ORM) come last on every database
+        if column.nullable:
+            order_by[0] = order_by[0].nulls_last()
         
-        # Get all products (simplified - no pagination to match your frontend)
-        products = query.all()
+        # Legacy unpaginated shape, only when explicitly requested
+        if return_all:
+            products = query.order_by(*order_by).all()
+            return fragment_response(json_array(product_fragments.get(p) for p in products)), 200
         
-        return jsonify([product.to_dict() for product in products]), 200
+        try:
+            limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+        except ValueError:
+            return jsonify({'error': 'Invalid limit'}), 400
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        
+        # Keyed on (sort column, id) so pages stay stable under inserts
+        cursor = request.args.get('cursor')
+        if cursor:
+            try:
+                value, last_id = decode_cursor(cursor, sort)
+            except ValueError:
+                return jsonify({'error': 'Invalid cursor'}), 400
+            after_id = Product.id < last_id if descending else Product.id > last_id
+            if value is None:
+                # Already into the trailing rows with no sort key
+                query = query.filter(column.is_(None), after_id)
+            else:
+                # Compare against the stored value of the anchor row so the
+                # database's own datetime format is used on both sides
+                anchor = db.func.coalesce(
+                    db.select(column).where(Product.id == last_id).scalar_subquery(),
+                    value
+                )
+                query = query.filter(db.or_(
+                    column < anchor if descending else column > anchor,
+                    db.and_(column == anchor, after_id),
+                    *([column.is_(None)] if column.nullable else [])
+                ))
+        
+        # Fetch one extra row to know whether another page exists
+        rows = query.order_by(*order_by).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        products = rows[:limit]
+        
+        response = {
+            'next_cursor': encode_cursor(products[-1], sort) if has_more else None,
+            'has_more': has_more
+        }
+        # Facets only change with the filters, so send them with the first page
+        if not cursor:
+            response['facets'] = compute_facets(filters)
+        
+        # Splice the cached product fragments in instead of re-encoding them
+        envelope = json.dumps(response, sort_keys=True, separators=(',', ':')).encode()
+        body = envelope[:-1] + b',"products":' + json_array(product_fragments.get(p) for p in products) + b'}'
+        return fragment_response(body), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 # Get single product
 @bp.route('/products/<int:product_id>', methods=['GET'])
+@cached('products', 'categories', shows_stock=True)
+@conditional_get('products', 'categories', shows_stock=True)
 def get_product(product_id):
     try:
-        product = Product.query.get_or_404(product_id)
-        return jsonify(product.to_dict()), 200
+        product = with_profile(Product.query, 'product').get_or_404(product_id)
+        return fragment_response(product_fragments.get(product)), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -118,11 +290,17 @@ def create_product():
         db.session.add(product)
         db.session.commit()
         
+        # Resized / WebP variants are attached to the product when ready
+        schedule_derivatives(current_app._get_current_object(), product.id, image_urls)
+        
         print("Product response:", product.to_dict())
         return jsonify(product.to_dict()), 201
         
     except ValueError as e:
         return jsonify({'error': 'Invalid price or stock value'}), 400
+    except RequestEntityTooLarge:
+        # Handled app-wide with a JSON 413
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -163,9 +341,9 @@ def update_product(product_id):
                 product.category_id = category.id
         
         # Handle new images if uploaded
+        image_urls = []
         uploaded_files = request.files.getlist('images')
         if uploaded_files and any(f.filename for f in uploaded_files):
-            image_urls = []
             for file in uploaded_files:
                 if file and file.filename:
                     file_url = save_uploaded_file(file)
@@ -178,16 +356,24 @@ def update_product(product_id):
             
             if replace_images:
                 product.set_image_urls(image_urls)
+                # Drop derivative manifests of the replaced images
+                variants = product.get_image_variants()
+                product.set_image_variants({url: variants[url] for url in image_urls if url in variants})
             else:
                 all_images = existing_images + image_urls
                 product.set_image_urls(all_images)
         
         db.session.commit()
         
+        schedule_derivatives(current_app._get_current_object(), product.id, image_urls)
+        
         return jsonify(product.to_dict()), 200
         
     except ValueError as e:
         return jsonify({'error': 'Invalid price or stock value'}), 400
+    except RequestEntityTooLarge:
+        # Handled app-wide with a JSON 413
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -205,17 +391,8 @@ def delete_product(product_id):
             
         product = Product.query.get_or_404(product_id)
         
-        # Delete associated image files
-        image_urls = product.get_image_urls()
-        for url in image_urls:
-            try:
-                # Convert URL to file path and delete
-                if url.startswith('/uploads/'):
-                    file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], url.split('/')[-1])
-                    if os.path.exists(file_path):
-                        os.remove(file_path)
-            except Exception as e:
-                print(f"Error deleting image file: {e}")
+        # Image files are content-addressed and may be shared, so they are
+        # left for `flask upload gc` to reclaim once nothing references them
         
         db.session.delete(product)
         db.session.commit()
@@ -227,6 +404,8 @@ def delete_product(product_id):
 
 # Get all categories (for dropdown)
 @bp.route('/categories', methods=['GET'])
+@cached('categories')
+@conditional_get('categories')
 def get_categories():
     try:
         categories = Category.query.all()
@@ -271,4 +450,30 @@ def create_category():
         return jsonify(category.to_dict()), 201
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+@bp.cli.command('backfill-images')
+def backfill_images():
+    """Build missing image derivatives for existing products."""
+    app = current_app._get_current_object()
+    futures = {}
+    for product in Product.query.order_by(Product.id).all():
+        variants = product.get_image_variants()
+        for url in product.get_image_urls():
+            if url in variants:
+                continue
+            paths = derivative_paths(app, url)
+            if not os.path.exists(paths[0]):
+                print(f"Skipping missing file {url}")
+                continue
+            futures[get_pool(app).submit(build_derivatives, *paths)] = (product.id, url)
+
+    built = 0
+    for future in as_completed(futures):
+        product_id, url = futures[future]
+        try:
+            if record_variants(app, product_id, url, future.result()):
+                built += 1
+        except Exception as e:
+            print(f"Error building derivatives for {url}: {e}")
+    print(f"Built derivatives for {built} of {len(futures)} images.")
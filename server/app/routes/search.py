@@ -0,0 +1,144 @@
+import re
+from flask import Blueprint, request, jsonify
+from markupsafe import escape
+from app import db
+from app.models import Product, BlogPost, with_profile
+from app.cache import cached, conditional_get
+
+bp = Blueprint('search', __name__)
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+
+# Kinds stored in search_index.kind
+SEARCH_KINDS = ('product', 'blog')
+
+# Private-use characters bracket FTS5 matches; they become <mark> tags only
+# after the indexed text around them has been HTML-escaped
+MARK_OPEN, MARK_CLOSE = '\ue000', '\ue001'
+
+def build_match_query(q):
+    """Turn free text into an FTS5 query of quoted prefix terms (AND-ed)"""
+    terms = re.findall(r'\w+', q)
+    return ' '.join(f'"{term}"*' for term in terms)
+
+def highlight(snippet):
+    """HTML-escape a snippet, then turn the match markers into <mark> tags"""
+    return str(escape(snippet)).replace(MARK_OPEN, '<mark>').replace(MARK_CLOSE, '</mark>')
+
+def fts_search(match, kinds, limit, offset):
+    """Ranked FTS5 lookup; returns (kind, ref_id, title, snippet, score) rows"""
+    sql = db.text(f"""
+        SELECT kind, ref_id, title,
+               snippet(search_index, -1, :mark_open, :mark_close, '…', 16) AS snippet,
+               bm25(search_index, 10.0, 1.0) AS score
+        FROM search_index
+        WHERE search_index MATCH :match
+          AND kind IN ({', '.join(f':kind{i}' for i in range(len(kinds)))})
+        ORDER BY score
+        LIMIT :limit OFFSET :offset
+    """)
+    params = {'match': match, 'limit': limit, 'offset': offset,
+              'mark_open': MARK_OPEN, 'mark_close': MARK_CLOSE}
+    params.update({f'kind{i}': kind for i, kind in enumerate(kinds)})
+    return db.session.execute(sql, params).all()
+
+def like_search(q, kinds, limit, offset):
+    """Unranked fallback for databases without FTS5"""
+    pattern = f"%{q}%"
+    rows = []
+    if 'product' in kinds:
+        products = Product.query.filter(db.or_(
+            Product.name.ilike(pattern), Product.description.ilike(pattern)
+        )).order_by(Product.id).limit(offset + limit).all()
+        rows += [('product', p.id, p.name, (p.description or '')[:120], 0.0) for p in products]
+    if 'blog' in kinds:
+        posts = BlogPost.query.filter(db.or_(
+            BlogPost.title.ilike(pattern), BlogPost.content.ilike(pattern)
+        )).order_by(BlogPost.id).limit(offset + limit).all()
+        rows += [('blog', p.id, p.title, p.content[:120], 0.0) for p in posts]
+    return rows[offset:offset + limit]
+
+@bp.route('/search', methods=['GET'])
+@cached('products', 'categories', 'blog', shows_stock=True)
+@conditional_get('products', 'categories', 'blog', shows_stock=True)
+def search():
+    try:
+        q = request.args.get('q', '').strip()
+        match = build_match_query(q)
+        if not match:
+            return jsonify({'error': 'Search query (q) is required'}), 400
+
+        kind = request.args.get('type', 'all')
+        if kind != 'all' and kind not in SEARCH_KINDS:
+            return jsonify({'error': 'Invalid type (product, blog or all)'}), 400
+        kinds = SEARCH_KINDS if kind == 'all' else (kind,)
+
+        try:
+            page = max(1, int(request.args.get('page', 1)))
+            limit = max(1, min(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE))
+        except ValueError:
+            return jsonify({'error': 'Invalid page or limit'}), 400
+        offset = (page - 1) * limit
+
+        # Fetch one extra row to know whether another page exists
+        if db.engine.dialect.name == 'sqlite':
+            rows = fts_search(match, kinds, limit + 1, offset)
+        else:
+            rows = like_search(q, kinds, limit + 1, offset)
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        # Hydrate product hits in one query for price, stock and images
+        product_ids = [row[1] for row in rows if row[0] == 'product']
+        products = {}
+        if product_ids:
+            products = {
+                p.id: p for p in
+                with_profile(Product.query, 'product').filter(Product.id.in_(product_ids)).all()
+            }
+
+        results = []
+        for row_kind, ref_id, title, snippet, score in rows:
+            result = {
+                'type': row_kind,
+                'id': ref_id,
+                'title': title,
+                'snippet': highlight(snippet or ''),
+                'score': -score  # bm25() is lower-is-better
+            }
+            if row_kind == 'product':
+                if ref_id not in products:
+                    continue
+                result['product'] = products[ref_id].to_dict()
+            results.append(result)
+
+        return jsonify({
+            'query': q,
+            'results': results,
+            'page': page,
+            'has_more': has_more
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.cli.command('rebuild-index')
+def rebuild_index():
+    """Rebuild the FTS5 search index from products and blog posts."""
+    if db.engine.dialect.name != 'sqlite':
+        print("Full-text index is only used on SQLite; nothing to rebuild.")
+        return
+    db.session.execute(db.text("DELETE FROM search_index"))
+    db.session.execute(db.text(
+        "INSERT INTO search_index (rowid, title, body, kind, ref_id) "
+        "SELECT id * 2, name, coalesce(description, ''), 'product', id FROM products"
+    ))
+    db.session.execute(db.text(
+        "INSERT INTO search_index (rowid, title, body, kind, ref_id) "
+        "SELECT id * 2 + 1, title, content, 'blog', id FROM blog_posts"
+    ))
+    db.session.execute(db.text("INSERT INTO search_index (search_index) VALUES ('optimize')"))
+    db.session.commit()
+    count = db.session.execute(db.text("SELECT count(*) FROM search_index")).scalar()
+    print(f"Search index rebuilt: {count} documents.")
@@ -1,6 +1,9 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 import os
-from werkzeug.utils import secure_filename
+import click
+from werkzeug.exceptions import RequestEntityTooLarge
+from app.tasks import start_periodic
+from app.uploads import collect_orphans, init_upload_store, store_upload
 
 upload_bp = Blueprint('upload', __name__)
 
@@ -10,6 +13,17 @@ def init_upload(app):
     app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
     if not os.path.exists(UPLOAD_FOLDER):
         os.makedirs(UPLOAD_FOLDER)
+    # Stream multipart uploads to disk and store them by content hash
+    init_upload_store(app)
+    # Optional in-process orphan sweep (UPLOAD_GC_INTERVAL seconds, 0 = off)
+    start_periodic(app, 'upload-gc', app.config.get('UPLOAD_GC_INTERVAL'), lambda: report_gc(
+        collect_orphans(app, app.config.get('UPLOAD_GC_GRACE_HOURS', 24) * 3600)
+    ))
+
+def report_gc(stats, dry_run=False):
+    verb = 'Would delete' if dry_run else 'Deleted'
+    print(f"Upload GC: scanned {stats['scanned']} files, {verb.lower()} {stats['deleted']} orphans, "
+          f"reclaimed {stats['bytes_reclaimed'] / (1024 * 1024):.1f}MB in {stats['elapsed_ms']}ms")
 
 @upload_bp.route('/upload', methods=['POST'])
 def upload_images():
@@ -22,13 +36,24 @@ def upload_images():
 
         for file in files:
             if file and file.filename:
-                filename = secure_filename(file.filename)
-                file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-                file.save(file_path)
-                uploaded_urls.append(f'/static/uploads/{filename}')
+                stored = store_upload(file, 'general')
+                if stored:
+                    uploaded_urls.append(f'/{stored}')
 
         return jsonify({"urls": uploaded_urls}), 200
+    except RequestEntityTooLarge:
+        # Handled app-wide with a JSON 413
+        raise
     except Exception as e:
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
-from flask import current_app  
\ No newline at end of file
+@upload_bp.cli.command('gc')
+@click.option('--grace-hours', type=float, default=None,
+              help='Only delete orphans older than this (default UPLOAD_GC_GRACE_HOURS).')
+@click.option('--dry-run', is_flag=True, help='Report orphans without deleting them.')
+def gc_uploads(grace_hours, dry_run):
+    """Delete product and blog uploads nothing references (general uploads are kept)."""
+    if grace_hours is None:
+        grace_hours = current_app.config.get('UPLOAD_GC_GRACE_HOURS', 24)
+    stats = collect_orphans(current_app._get_current_object(), grace_hours * 3600, dry_run)
+    report_gc(stats, dry_run)
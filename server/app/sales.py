@@ -0,0 +1,118 @@
+"""Daily sales rollups behind the admin dashboard.
+
+sales_daily holds orders, units and revenue per (day, product), with the
+product's category alongside. sales_day_totals holds the same figures
+per day. An order counts while its status is in COUNTED_STATUSES.
+
+apply_order() adds or removes one order inside the caller's transaction.
+It upserts signed deltas, so concurrent checkouts never do a
+read-modify-write on a shared row. rebuild_sales() recomputes a range of
+days from the order tables and the archive.
+"""
+import time
+
+from sqlalchemy import delete, func, select
+
+from app import db
+from app.archive import archive_months, archive_tables
+from app.carts import dialect_insert
+from app.models import Order, OrderLine, Product, SalesDaily, SalesDayTotal
+
+COUNTED_STATUSES = frozenset({'paid', 'completed'})
+_MEASURES = ('order_count', 'units', 'revenue')
+
+
+def _add_to(model, keys, stmt, replace=()):
+    # Existing rows absorb the new figures; `replace` columns take the latest value
+    set_ = {name: getattr(model, name) + stmt.excluded[name] for name in _MEASURES}
+    set_.update({name: stmt.excluded[name] for name in replace})
+    return stmt.on_conflict_do_update(index_elements=keys, set_=set_)
+
+
+def apply_order(order, sign=1):
+    """Add (sign=1) or remove (sign=-1) an order's lines in the rollups"""
+    if not order.lines:
+        return
+    day = order.created_at.date()
+    per_product = {}
+    for line in order.lines:
+        units, revenue = per_product.get(line.product_id, (0, 0.0))
+        per_product[line.product_id] = (units + line.quantity, revenue + line.line_total)
+    categories = dict(db.session.execute(
+        select(Product.id, Product.category_id).where(Product.id.in_(per_product))
+    ).all())
+
+    # Sorted, so concurrent checkouts lock rows in the same order
+    rows = [
+        {'day': day, 'product_id': product_id, 'category_id': categories.get(product_id),
+         'order_count': sign, 'units': sign * units, 'revenue': sign * revenue}
+        for product_id, (units, revenue) in sorted(per_product.items())
+    ]
+    db.session.execute(_add_to(SalesDaily, ['day', 'product_id'], dialect_insert(SalesDaily).values(rows),
+                               replace=('category_id',)))
+    db.session.execute(_add_to(SalesDayTotal, ['day'], dialect_insert(SalesDayTotal).values(
+        day=day, order_count=sign,
+        units=sign * sum(units for units, _ in per_product.values()),
+        revenue=sign * sum(revenue for _, revenue in per_product.values()),
+    )))
+
+
+def status_change(order, new_status):
+    """Move an order in or out of the rollups when its status crosses COUNTED_STATUSES"""
+    was_counted = order.status in COUNTED_STATUSES
+    if was_counted != (new_status in COUNTED_STATUSES):
+        apply_order(order, -1 if was_counted else 1)
+
+
+def rebuild_sales(start=None, end=None):
+    """Recompute the rollups for days start..end (inclusive dates, None = open).
+
+    Hot and archived orders are aggregated with one INSERT ... SELECT per
+    source table, in a single transaction. Returns rows written and elapsed time.
+    """
+    started = time.monotonic()
+
+    def in_range(day):
+        conditions = []
+        if start is not None:
+            conditions.append(day >= start)
+        if end is not None:
+            conditions.append(day <= end)
+        return conditions
+
+    db.session.execute(delete(SalesDaily).where(*in_range(SalesDaily.day)))
+    db.session.execute(delete(SalesDayTotal).where(*in_range(SalesDayTotal.day)))
+
+    products = Product.__table__
+    sources = [(Order.__table__, OrderLine.__table__)]
+    sources += [archive_tables(month) for month in archive_months(start, end)]
+    for orders, lines in sources:
+        day = func.date(orders.c.created_at)
+        counted = [orders.c.status.in_(COUNTED_STATUSES), *in_range(day)]
+        per_product = (
+            select(day, lines.c.product_id, products.c.category_id, func.count(func.distinct(orders.c.id)),
+                   func.sum(lines.c.quantity), func.sum(lines.c.line_total))
+            .select_from(lines.join(orders, lines.c.order_id == orders.c.id)
+                         .outerjoin(products, products.c.id == lines.c.product_id))
+            .where(*counted)
+            .group_by(day, lines.c.product_id, products.c.category_id)
+        )
+        db.session.execute(_add_to(SalesDaily, ['day', 'product_id'], dialect_insert(SalesDaily).from_select(
+            ['day', 'product_id', 'category_id', *_MEASURES], per_product
+        ), replace=('category_id',)))
+        per_day = (
+            select(day, func.count(), func.sum(orders.c.item_count), func.sum(orders.c.total_price))
+            .where(*counted)
+            .group_by(day)
+        )
+        db.session.execute(_add_to(SalesDayTotal, ['day'], dialect_insert(SalesDayTotal).from_select(
+            ['day', *_MEASURES], per_day
+        )))
+
+    stats = {
+        'days': db.session.scalar(select(func.count()).select_from(SalesDayTotal).where(*in_range(SalesDayTotal.day))),
+        'product_days': db.session.scalar(select(func.count()).select_from(SalesDaily).where(*in_range(SalesDaily.day))),
+    }
+    db.session.commit()
+    stats['elapsed_ms'] = round((time.monotonic() - started) * 1000, 1)
+    return stats
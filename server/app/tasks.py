@@ -0,0 +1,68 @@
+"""In-process periodic jobs, run at most once per interval per host.
+
+Every web worker starts the thread. They share one lock file per job
+under the instance folder, which records when the job last started, so
+a tick that finds the job ran less than `interval` seconds ago is
+skipped. Flask CLI commands (`flask db upgrade`, `flask orders ...`)
+never start the threads; only `flask run` does.
+"""
+import fcntl
+import os
+import threading
+import time
+
+import click
+
+
+def _in_cli_command():
+    # The app is built inside the click context of the command being run
+    ctx = click.get_current_context(silent=True)
+    return ctx is not None and ctx.command.name != 'run'
+
+
+def _last_run(lock_file):
+    lock_file.seek(0)
+    try:
+        return float(lock_file.read() or 0)
+    except ValueError:
+        return 0.0
+
+
+def _run_locked(app, name, interval, job):
+    lock_path = os.path.join(app.instance_path, f'{name}.lock')
+    with open(lock_path, 'a+') as lock_file:
+        # The non-blocking flock stops runs overlapping; the recorded start
+        # time stops the other workers' threads repeating a run in the same interval
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return
+        try:
+            now = time.time()
+            if now - _last_run(lock_file) < interval:
+                return
+            lock_file.truncate(0)
+            lock_file.write(repr(now))
+            lock_file.flush()
+            with app.app_context():
+                job()
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def start_periodic(app, name, interval, job):
+    """Run `job()` inside an app context every `interval` seconds on a daemon thread"""
+    if not interval or _in_cli_command():
+        return None
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                _run_locked(app, name, interval, job)
+            except Exception as e:
+                print(f"Periodic job {name} failed: {e}")
+
+    thread = threading.Thread(target=loop, name=f'periodic-{name}', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,260 @@
+"""Streaming, size-bounded, content-addressed store for uploaded images.
+
+Werkzeug writes each multipart file part straight into a HashingSpool in
+the staging folder, so bodies are never buffered in memory and the
+SHA-256 digest is known as soon as parsing finishes. store_upload() then
+moves the spool to static/uploads/<category>/<aa>/<digest>.<ext>, or
+drops it when that file already exists.
+"""
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import tempfile
+import time
+
+from flask import Request, Response, abort, current_app, request
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.security import safe_join
+from werkzeug.utils import send_file
+
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+CHUNK_SIZE = 64 * 1024
+
+# Content-addressed files (and their derivatives) never change once written
+FINGERPRINT_RE = re.compile(r'^([0-9a-f]{64})(?:_w\d+)?\.[a-z0-9]+$')
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+DERIVED_STEM_RE = re.compile(r'_w\d+$')
+
+# Upload folders whose files are referenced by a model and can be collected.
+# Others, such as 'general' from POST /api/upload, have no record to check against
+GC_FOLDERS = ('products', 'blog')
+
+
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+def staging_dir(app):
+    return os.path.join(app.instance_path, 'upload_staging')
+
+
+class HashingSpool:
+    """File-like sink that hashes and size-checks chunks as they are written"""
+
+    def __init__(self, directory, max_size=None):
+        fd, self.name = tempfile.mkstemp(dir=directory, prefix='upload-')
+        self._file = os.fdopen(fd, 'w+b')
+        self._hash = hashlib.sha256()
+        self.size = 0
+        self.max_size = max_size
+        self.committed = False
+
+    def write(self, data):
+        self.size += len(data)
+        if self.max_size and self.size > self.max_size:
+            self.close()
+            raise RequestEntityTooLarge(f"File too large (max {self.max_size / (1024 * 1024):g}MB per file)")
+        self._hash.update(data)
+        return self._file.write(data)
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+        # Anything not moved into the store is discarded with the request
+        if not self.committed and os.path.exists(self.name):
+            os.unlink(self.name)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+class UploadRequest(Request):
+    """Request whose multipart file parts stream into HashingSpools"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None,
+                         content_length=None):
+        return HashingSpool(
+            staging_dir(current_app),
+            current_app.config.get('MAX_UPLOAD_FILE_SIZE'),
+        )
+
+
+def store_upload(file, category):
+    """Store an uploaded file by content hash; returns 'static/uploads/...' or None"""
+    if not file or not file.filename or not allowed_file(file.filename):
+        return None
+
+    spool = file.stream
+    if not isinstance(spool, HashingSpool):
+        # Files that did not come through UploadRequest parsing
+        spool = HashingSpool(staging_dir(current_app), current_app.config.get('MAX_UPLOAD_FILE_SIZE'))
+        for chunk in iter(lambda: file.stream.read(CHUNK_SIZE), b''):
+            spool.write(chunk)
+
+    spool.flush()
+    digest = spool.hexdigest()
+    ext = file.filename.rsplit('.', 1)[1].lower()
+    # Two-character fan-out keeps every directory small
+    relative_dir = f"static/uploads/{category}/{digest[:2]}"
+    target_dir = os.path.join(current_app.root_path, relative_dir)
+    os.makedirs(target_dir, exist_ok=True)
+    target = os.path.join(target_dir, f"{digest}.{ext}")
+
+    if os.path.exists(target):
+        # Same bytes already stored: no copy, the spool is simply dropped.
+        # The stored file restarts its orphan grace period like a new upload
+        spool.close()
+        _touch_stored(target_dir, digest, ext)
+    else:
+        spool._file.close()
+        try:
+            os.replace(spool.name, target)
+        except OSError:
+            # Staging folder on another filesystem
+            shutil.move(spool.name, target)
+        spool.committed = True
+
+    return f"{relative_dir}/{digest}.{ext}"
+
+
+def _touch_stored(target_dir, digest, ext):
+    # collect_orphans() goes by mtime, so refresh the file and its derivatives
+    os.utime(os.path.join(target_dir, f"{digest}.{ext}"))
+    derived_dir = os.path.join(target_dir, 'derived')
+    if os.path.isdir(derived_dir):
+        with os.scandir(derived_dir) as entries:
+            for entry in entries:
+                if entry.name.startswith(f"{digest}_w") and not entry.name.endswith('.tmp'):
+                    os.utime(entry.path)
+
+
+def upload_fingerprint(filename):
+    """The content digest embedded in a stored file name, or None for legacy names"""
+    match = FINGERPRINT_RE.match(os.path.basename(filename))
+    return match.group(1) if match else None
+
+
+def send_upload(filename):
+    """Serve a file under static/uploads with cache headers suited to its name.
+
+    Fingerprinted files are cacheable forever. Range and HEAD requests are
+    answered by Werkzeug. With UPLOAD_SENDFILE_MODE set to 'x-accel' or
+    'x-sendfile', only headers are returned and the front proxy streams the
+    bytes itself.
+    """
+    upload_root = os.path.join(current_app.root_path, 'static', 'uploads')
+    path = safe_join(upload_root, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    fingerprint = upload_fingerprint(filename)
+    max_age = IMMUTABLE_MAX_AGE if fingerprint else current_app.config.get('UPLOAD_MAX_AGE', 86400)
+    mode = current_app.config.get('UPLOAD_SENDFILE_MODE')
+
+    if mode == 'x-accel':
+        # nginx: `location /_uploads/ { internal; alias .../static/uploads/; }`
+        response = Response(mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream')
+        prefix = current_app.config.get('UPLOAD_ACCEL_PREFIX', '/_uploads/')
+        response.headers['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + filename
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+    else:
+        response = send_file(
+            path,
+            request.environ,
+            max_age=max_age,
+            etag=fingerprint or True,
+            use_x_sendfile=(mode == 'x-sendfile'),
+        )
+
+    if fingerprint:
+        response.cache_control.immutable = True
+    return response
+
+
+def referenced_upload_paths():
+    """Upload-relative paths of every file a product or blog post points at,
+    plus the (folder, stem) keys their derivatives are named after"""
+    from app.models import BlogPost, Product
+
+    paths = set()
+    for (image_urls,) in Product.query.with_entities(Product.image_urls):
+        if image_urls:
+            paths.update(json.loads(image_urls))
+    for (thumbnail,) in BlogPost.query.with_entities(BlogPost.thumbnail):
+        if thumbnail:
+            paths.add(thumbnail)
+
+    prefix = 'static/uploads/'
+    paths = {p.lstrip('/')[len(prefix):] for p in paths if p.lstrip('/').startswith(prefix)}
+    stems = {(os.path.dirname(p), os.path.splitext(os.path.basename(p))[0]) for p in paths}
+    return paths, stems
+
+
+def _is_referenced(relative, paths, stems):
+    if relative in paths:
+        return True
+    folder, name = os.path.split(relative)
+    # <dir>/derived/<stem>_w<width>.<ext> lives as long as <dir>/<stem>.*
+    if os.path.basename(folder) == 'derived':
+        stem = DERIVED_STEM_RE.sub('', os.path.splitext(name)[0])
+        return (os.path.dirname(folder), stem) in stems
+    return False
+
+
+def collect_orphans(app, grace_seconds, dry_run=False):
+    """Delete uploads in GC_FOLDERS that nothing references and are older than the grace period.
+
+    Returns counts, bytes reclaimed and elapsed time.
+    """
+    started = time.monotonic()
+    cutoff = time.time() - grace_seconds
+    upload_root = os.path.join(app.root_path, 'static', 'uploads')
+    paths, stems = referenced_upload_paths()
+    stats = {'scanned': 0, 'deleted': 0, 'bytes_reclaimed': 0}
+
+    def remove(entry):
+        stats['deleted'] += 1
+        stats['bytes_reclaimed'] += entry.stat().st_size
+        if not dry_run:
+            os.unlink(entry.path)
+
+    pending = [os.path.join(upload_root, folder) for folder in GC_FOLDERS
+               if os.path.isdir(os.path.join(upload_root, folder))]
+    while pending:
+        folder = pending.pop()
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                    continue
+                stats['scanned'] += 1
+                # Spools still being written carry a fresh mtime
+                if entry.stat().st_mtime > cutoff or entry.name.endswith('.tmp'):
+                    continue
+                relative = os.path.relpath(entry.path, upload_root).replace(os.sep, '/')
+                if not _is_referenced(relative, paths, stems):
+                    remove(entry)
+
+    # Spools left behind by crashed requests
+    staging = staging_dir(app)
+    if os.path.isdir(staging):
+        with os.scandir(staging) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.stat().st_mtime <= cutoff:
+                    stats['scanned'] += 1
+                    remove(entry)
+
+    stats['elapsed_ms'] = round((time.monotonic() - started) * 1000, 1)
+    return stats
+
+
+def init_upload_store(app):
+    app.request_class = UploadRequest
+    os.makedirs(staging_dir(app), exist_ok=True)
@@ -0,0 +1,141 @@
+"""Concurrent checkout stress test: stock must never oversell.
+
+Run from the server/ folder:
+
+    python benchmarks/checkout_stress.py [--buyers 200] [--workers 16] [--stock 150] [--duplicates 1]
+
+Every buyer gets a cart with 1-3 units of the same two products, then all of
+them hit POST /api/checkout at once from a thread pool. The run fails (exit
+status 1) if stock goes negative or the units sold differ from the stock
+that was taken or from the daily sales rollup. With --duplicates N every
+buyer sends N concurrent copies of the request under one Idempotency-Key,
+and the run also fails if any buyer ends up with more than one order.
+Finally a guest holds the last unit of a product, signs in and checks
+out; the hold must carry over to the user's cart.
+Uses a throwaway SQLite file unless --database-url is given.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--buyers', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--stock', type=int, default=150)
+    parser.add_argument('--duplicates', type=int, default=1,
+                        help='Concurrent retries per buyer sharing one Idempotency-Key.')
+    parser.add_argument('--database-url', default=None)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='checkout-stress-')
+    database_url = args.database_url or f"sqlite:///{os.path.join(workdir, 'stress.db')}"
+    # Config reads the environment at import time
+    os.environ['DATABASE_URL'] = database_url
+    os.environ['RESPONSE_CACHE_PATH'] = os.path.join(workdir, 'cache.db')
+    os.environ['STOCK_HOLD_SWEEP_INTERVAL'] = '0'
+    os.environ['GUEST_CART_SWEEP_INTERVAL'] = '0'
+
+    from flask_jwt_extended import create_access_token
+    from sqlalchemy import create_engine
+    from app import create_app, db
+    from app.models import CartItem, Category, Order, OrderLine, Product, SalesDaily, User
+    from config import ProductionConfig
+
+    db.metadata.create_all(create_engine(database_url))
+    app = create_app(ProductionConfig)
+    random.seed(args.seed)
+
+    with app.app_context():
+        category = Category.query.first()
+        products = [Product(name=f'Stress tote {n}', price=20.0, stock=args.stock, category_id=category.id)
+                    for n in range(2)]
+        db.session.add_all(products)
+        buyers = [User(name=f'Buyer {n}', email=f'buyer{n}@example.com', password_hash='x')
+                  for n in range(args.buyers)]
+        db.session.add_all(buyers)
+        db.session.flush()
+        for user in buyers:
+            for product in products:
+                quantity = random.randint(1, 3)
+                db.session.add(CartItem(user_id=user.id, product_id=product.id, quantity=quantity))
+        db.session.commit()
+        product_ids = [p.id for p in products]
+        category_id = category.id
+        demand = {pid: db.session.query(db.func.sum(CartItem.quantity)).filter_by(product_id=pid).scalar()
+                  for pid in product_ids}
+        tokens = [create_access_token(identity=user.id) for user in buyers]
+
+    client = app.test_client()
+
+    def checkout(attempt):
+        token, key = attempt
+        headers = {'Authorization': f'Bearer {token}'}
+        if args.duplicates > 1:
+            headers['Idempotency-Key'] = key
+        try:
+            response = client.post('/api/checkout', json={}, headers=headers)
+            return response.status_code
+        except Exception as e:
+            return type(e).__name__
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        attempts = [(token, f'buyer-{n}') for n, token in enumerate(tokens) for _ in range(args.duplicates)]
+        random.shuffle(attempts)
+        outcomes = list(pool.map(checkout, attempts))
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        stock = {pid: db.session.get(Product, pid).stock for pid in product_ids}
+        sold = {pid: db.session.query(db.func.coalesce(db.func.sum(OrderLine.quantity), 0))
+                .join(Order).filter(OrderLine.product_id == pid, Order.status == 'paid').scalar()
+                for pid in product_ids}
+        # The daily rollup is written in the checkout transaction, so it must agree
+        rolled_up = {pid: db.session.query(db.func.coalesce(db.func.sum(SalesDaily.units), 0))
+                     .filter(SalesDaily.product_id == pid).scalar()
+                     for pid in product_ids}
+        most_orders = db.session.query(db.func.count(Order.id)).group_by(Order.user_id) \
+            .order_by(db.func.count(Order.id).desc()).limit(1).scalar() or 0
+
+    # Guest reserves the last unit, signs in, and must be able to buy it
+    with app.app_context():
+        last = Product(name='Stress last unit', price=20.0, stock=1, category_id=category_id)
+        guest = User(name='Guest buyer', email='guest-buyer@example.com', password_hash='x')
+        db.session.add_all([last, guest])
+        db.session.commit()
+        last_id = last.id
+        guest_token = create_access_token(identity=guest.id)
+    guest_client = app.test_client()
+    guest_client.post('/api/guest-cart', json={'product_id': last_id, 'quantity': 1})
+    reserved = guest_client.post('/api/checkout/reserve', json={}).status_code
+    handoff = guest_client.post('/api/checkout', json={},
+                                headers={'Authorization': f'Bearer {guest_token}'}).status_code
+
+    counts = {outcome: outcomes.count(outcome) for outcome in set(outcomes)}
+    print(f"{args.buyers} buyers x {args.duplicates} requests, {args.workers} workers, {elapsed:.2f}s")
+    print(f"outcomes: {counts}")
+    failed = most_orders > 1
+    print(f"most orders for one buyer: {most_orders} {'OK' if not failed else 'DUPLICATED'}")
+    handoff_ok = reserved == 200 and handoff == 200
+    failed |= not handoff_ok
+    print(f"guest hold after sign-in: reserve {reserved}, checkout {handoff} {'OK' if handoff_ok else 'HOLD LOST'}")
+    for pid in product_ids:
+        taken = args.stock - stock[pid]
+        ok = stock[pid] >= 0 and taken == sold[pid] == rolled_up[pid]
+        failed |= not ok
+        print(f"product {pid}: demand {demand[pid]}, stock {args.stock} -> {stock[pid]}, "
+              f"sold {sold[pid]}, rolled up {rolled_up[pid]} {'OK' if ok else 'OVERSOLD / MISMATCH'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Serialization cost of a product listing: to_dict + jsonify vs cached fragments.
+
+Run from the server/ folder:
+
+    python benchmarks/product_serialization.py [--products 1000] [--rounds 50]
+
+Products are built in memory with a category and typical image data, so only
+serialization is measured, not the query.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, jsonify  # noqa: E402
+from app.cache import FragmentCache, json_array  # noqa: E402
+from app.models import Category, Product  # noqa: E402
+
+
+def build_products(count):
+    category = Category(id=1, name='Tote Bag', slug='tote-bag')
+    now = datetime.utcnow()
+    products = []
+    for i in range(count):
+        urls = [f'static/uploads/products/{i:02x}/{"ab" * 32}_{n}.jpeg' for n in range(3)]
+        product = Product(
+            id=i + 1, name=f'Upcycled tote {i}', price=25.0 + i % 40, stock=i % 7,
+            description='Hand-made from reclaimed textile offcuts. ' * 4,
+            category_id=1, created_at=now, updated_at=now,
+        )
+        product.category = category
+        product.set_image_urls(urls)
+        products.append(product)
+    return products
+
+
+def timed(fn, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - start) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--rounds', type=int, default=50)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    products = build_products(args.products)
+    fragments = FragmentCache(max_entries=args.products)
+
+    with app.app_context():
+        before = timed(lambda: jsonify([p.to_dict() for p in products]).get_data(), args.rounds)
+        for p in products:
+            fragments.get(p)  # warm
+        after = timed(lambda: json_array(fragments.get(p) for p in products), args.rounds)
+
+        assert json.loads(json_array(fragments.get(p) for p in products)) == \
+            json.loads(jsonify([p.to_dict() for p in products]).get_data())
+
+    per_1k = 1000 / args.products
+    print(f"{args.products} products, {args.rounds} rounds\n")
+    print(f"{'to_dict + jsonify':28} {before * per_1k * 1000:8.2f} ms per 1k products")
+    print(f"{'cached fragments (warm)':28} {after * per_1k * 1000:8.2f} ms per 1k products")
+    print(f"{'speedup':28} {before / after:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+"""Query-plan regression check: no hot route may fall back to a full table scan.
+
+Run from the server/ folder:
+
+    python benchmarks/query_plans.py [--verbose]
+
+Builds a throwaway SQLite database from the Alembic migrations (so missing
+migration indexes show up, not just model ones), seeds it, then calls the
+hot cart, order, product and blog routes through the test client. Every
+statement they run is replayed under EXPLAIN QUERY PLAN. The run fails
+(exit status 1) if any plan has a bare `SCAN <table>` that is not listed
+in ALLOWED_SCANS.
+"""
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+from types import SimpleNamespace
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# A SCAN without an index walks the whole table
+FULL_SCAN_RE = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+
+# (table pattern, pattern the statement must match, why scanning is expected)
+ALLOWED_SCANS = [
+    (re.compile(r'categories$'), re.compile(r'^SELECT categories\.'), 'GET /categories returns every row'),
+    (re.compile(r'products$'), re.compile(r'GROUP BY'), 'facet counts aggregate every matching product'),
+    # No WHERE anywhere: filtered listings (?status=, ?user_id=) must use their indexes
+    (re.compile(r'orders(_archive_\d{4}_\d{2})?$'),
+     re.compile(r'^(?!.*\bWHERE\b).*ORDER BY order_history\.id DESC LIMIT'),
+     'the unfiltered admin listing walks ids newest first and stops after LIMIT rows'),
+]
+
+
+def allowed(table, statement):
+    return any(name.match(table) and pattern.search(statement) for name, pattern, _ in ALLOWED_SCANS)
+
+
+def seed(db, models):
+    Category, Product, BlogPost, User, Order = (
+        models.Category, models.Product, models.BlogPost, models.User, models.Order
+    )
+    category = Category.query.first()
+    products = [Product(name=f'Plan tote {n}', price=10.0 + n % 90, stock=50, category_id=category.id)
+                for n in range(200)]
+    db.session.add_all(products)
+    db.session.add_all([BlogPost(title=f'Post {n}', content='...', date=datetime.utcnow() - timedelta(days=n))
+                        for n in range(50)])
+    admin = User(name='Admin', email='admin@plans.test', role='admin')
+    admin.set_password('x')
+    buyer = User(name='Buyer', email='buyer@plans.test')
+    buyer.set_password('x')
+    db.session.add_all([admin, buyer])
+    db.session.flush()
+    for n in range(60):
+        order = Order.from_cart(buyer.id, [SimpleNamespace(product=products[n], quantity=1)],
+                                status='completed' if n % 2 else 'paid')
+        order.created_at = datetime.utcnow() - timedelta(days=10 * n)
+        db.session.add(order)
+    db.session.commit()
+    return admin.id, buyer.id, [p.id for p in products[:5]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--verbose', action='store_true', help='Print every statement and its plan.')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='query-plans-')
+    database_path = os.path.join(workdir, 'plans.db')
+    # Config reads the environment at import time
+    os.environ['DATABASE_URL'] = f'sqlite:///{database_path}'
+    os.environ['RESPONSE_CACHE_ENABLED'] = 'false'
+    os.environ['STOCK_HOLD_SWEEP_INTERVAL'] = '0'
+    os.environ['GUEST_CART_SWEEP_INTERVAL'] = '0'
+    os.environ['ORDER_ARCHIVE_INTERVAL'] = '0'
+
+    from flask import Flask
+    from flask_jwt_extended import create_access_token
+    from flask_migrate import Migrate, upgrade
+    from sqlalchemy import event
+    from app import create_app, db, models
+    from app.archive import archive_orders
+    from config import ProductionConfig
+
+    # create_app() expects the tables to exist, so migrate from a bare app first
+    bare = Flask(__name__)
+    bare.config['SQLALCHEMY_DATABASE_URI'] = os.environ['DATABASE_URL']
+    db.init_app(bare)
+    Migrate(bare, db)
+    with bare.app_context():
+        upgrade(directory=os.path.join(SERVER_DIR, 'migrations'))
+
+    app = create_app(ProductionConfig)
+    with app.app_context():
+        admin_id, buyer_id, product_ids = seed(db, models)
+        # Half the history moves to the archive, so UNION reads are covered too
+        archive_orders(200, ['completed', 'cancelled'])
+        admin = {'Authorization': f'Bearer {create_access_token(identity=admin_id)}'}
+        buyer = {'Authorization': f'Bearer {create_access_token(identity=buyer_id)}'}
+        slug = models.Category.query.first().slug
+        engine = db.engine
+
+    client = app.test_client()
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')):
+            # Plain executemany passes a list of rows; insertmanyvalues batches pass one flat row
+            if executemany and parameters and isinstance(parameters[0], (tuple, list, dict)):
+                parameters = parameters[0]
+            statements.append((statement, parameters))
+
+    def call(method, url, **kwargs):
+        response = client.open(url, method=method, **kwargs)
+        assert response.status_code < 400, f'{method} {url}: {response.status_code} {response.get_data(as_text=True)[:200]}'
+        return response.get_json()
+
+    first_page = call('GET', '/api/me/orders?limit=5', headers=buyer)
+    admin_page = call('GET', '/api/orders?limit=5', headers=admin)
+    products_page = call('GET', '/api/products?limit=12&sort=price_asc')
+
+    event.listen(engine, 'before_cursor_execute', capture)
+    scenarios = [
+        # products.py
+        ('GET', '/api/products?limit=12', {}),
+        ('GET', '/api/products?limit=12&sort=price_asc&cursor=' + products_page['next_cursor'], {}),
+        ('GET', f'/api/products?limit=12&category={slug}&sort=price_desc', {}),
+        ('GET', '/api/products?limit=12&sort=name', {}),
+        ('GET', f'/api/products/{product_ids[0]}', {}),
+        ('GET', '/api/categories', {}),
+        # blog.py
+        ('GET', '/api/blog', {}),
+        # cart.py, signed in
+        ('POST', '/api/cart', {'headers': buyer, 'json': {'product_id': product_ids[0], 'quantity': 1}}),
+        ('PATCH', '/api/cart', {'headers': buyer, 'json': {'operations': [
+            {'op': 'add', 'product_id': product_ids[1], 'quantity': 2},
+            {'op': 'set', 'product_id': product_ids[0], 'quantity': 3},
+        ]}}),
+        ('GET', '/api/cart', {'headers': buyer}),
+        ('POST', '/api/checkout/reserve', {'headers': buyer, 'json': {}}),
+        ('POST', '/api/checkout', {'headers': {**buyer, 'Idempotency-Key': 'plan-check'}, 'json': {}}),
+        ('POST', '/api/checkout', {'headers': {**buyer, 'Idempotency-Key': 'plan-check'}, 'json': {}}),
+        # orders.py
+        ('POST', '/api/orders', {'headers': buyer, 'json': {'product_id': product_ids[4], 'quantity': 1}}),
+        ('GET', '/api/me/orders?limit=5&cursor=' + first_page['next_cursor'], {'headers': buyer}),
+        ('GET', '/api/orders?limit=5', {'headers': admin}),
+        ('GET', '/api/orders?limit=5&cursor=' + admin_page['next_cursor'], {'headers': admin}),
+        ('GET', '/api/orders?limit=5&status=paid', {'headers': admin}),
+        ('GET', f'/api/orders?limit=5&user_id={buyer_id}', {'headers': admin}),
+        ('GET', '/api/admin/stats', {'headers': admin}),
+        # cart.py / orders.py, guest (the test client keeps the guest_session cookie)
+        ('POST', '/api/guest-cart', {'json': {'product_id': product_ids[2], 'quantity': 1}}),
+        ('POST', '/api/cart', {'json': {'product_id': product_ids[3], 'quantity': 1}}),
+        ('GET', '/api/cart', {}),
+    ]
+    for method, url, kwargs in scenarios:
+        call(method, url, **kwargs)
+    # Guest cart lines are addressed by row id
+    guest_lines = call('GET', '/api/cart')
+    call('PUT', f"/api/cart/{guest_lines[0]['id']}", json={'quantity': 2})
+    call('DELETE', f"/api/cart/{guest_lines[-1]['id']}")
+    # Signing in with the cookie still set merges the guest cart
+    call('GET', '/api/cart', headers=buyer)
+    event.remove(engine, 'before_cursor_execute', capture)
+
+    connection = sqlite3.connect(database_path)
+    # CTEs and subqueries show up as SCAN <name> too
+    tables = {name for (name,) in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    failures = 0
+    seen = set()
+    for statement, parameters in statements:
+        if statement in seen:
+            continue
+        seen.add(statement)
+        flat = ' '.join(statement.split())
+        plan = [row[3] for row in connection.execute(f'EXPLAIN QUERY PLAN {statement}', parameters)]
+        scans = [m.group(1) for m in map(FULL_SCAN_RE.match, plan) if m and m.group(1) in tables]
+        bad = [table for table in scans if not allowed(table, flat)]
+        if bad or args.verbose:
+            print(flat)
+            for step in plan:
+                print(f'    {step}')
+        if bad:
+            failures += 1
+            print(f"    FULL SCAN of {', '.join(bad)}\n")
+    connection.close()
+
+    print(f'{len(seen)} distinct statements from {len(scenarios) + 6} requests, '
+          f'{failures} with unexpected full table scans')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
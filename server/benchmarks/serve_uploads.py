@@ -0,0 +1,88 @@
+"""Throughput of uploaded-image serving: old send_from_directory vs send_upload.
+
+Run from the server/ folder:
+
+    python benchmarks/serve_uploads.py [--requests 2000] [--size-kb 350]
+
+Each scenario drives the WSGI app in-process, so the numbers are worker time
+per image (what a gunicorn worker is blocked for), not network throughput.
+"""
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, send_from_directory  # noqa: E402
+from app.uploads import send_upload  # noqa: E402
+
+
+def build_app(root):
+    app = Flask(__name__, root_path=root, static_folder=None)
+
+    # Before: the original products route
+    @app.route('/before/<path:filename>')
+    def before(filename):
+        return send_from_directory(os.path.join(root, 'static', 'uploads', 'products'), filename)
+
+    @app.route('/static/uploads/<path:filename>')
+    def after(filename):
+        return send_upload(filename)
+
+    return app
+
+
+def run(client, url, count, headers=None):
+    total_bytes = 0
+    start = time.perf_counter()
+    for _ in range(count):
+        response = client.get(url, headers=headers or {})
+        total_bytes += len(response.get_data())
+        response.close()
+    elapsed = time.perf_counter() - start
+    return count / elapsed, total_bytes / elapsed / (1024 * 1024), response.status_code
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--size-kb', type=int, default=350)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        data = os.urandom(args.size_kb * 1024)
+        digest = hashlib.sha256(data).hexdigest()
+        folder = os.path.join(root, 'static', 'uploads', 'products', digest[:2])
+        os.makedirs(folder)
+        with open(os.path.join(folder, f'{digest}.jpg'), 'wb') as f:
+            f.write(data)
+        relative = f'{digest[:2]}/{digest}.jpg'
+
+        app = build_app(root)
+        client = app.test_client()
+        old_etag = client.get(f'/before/{relative}').headers['ETag']
+
+        scenarios = [
+            ('before: full GET', f'/before/{relative}', None, None),
+            ('before: repeat visit (no-cache -> 304)', f'/before/{relative}', {'If-None-Match': old_etag}, None),
+            ('after: full GET', f'/static/uploads/products/{relative}', None, None),
+            ('after: Range GET (64KB)', f'/static/uploads/products/{relative}', {'Range': 'bytes=0-65535'}, None),
+            ('after: X-Accel-Redirect', f'/static/uploads/products/{relative}', None, 'x-accel'),
+        ]
+
+        print(f"{args.requests} requests per scenario, {args.size_kb}KB image\n")
+        print(f"{'scenario':42} {'req/s':>10} {'MB/s via Python':>16} {'status':>7}")
+        for name, url, headers, mode in scenarios:
+            app.config['UPLOAD_SENDFILE_MODE'] = mode
+            rps, mbps, status = run(client, url, args.requests, headers)
+            print(f"{name:42} {rps:10.0f} {mbps:16.1f} {status:>7}")
+
+        # With Cache-Control: immutable a repeat visit sends no request at all
+        print(f"{'after: repeat visit (immutable)':42} {'no request':>10} {0:16.1f} {'-':>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -5,6 +5,55 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SECRET_KEY = os.urandom(24)
     UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'uploads')
+    # Werkzeug rejects larger request bodies with 413 before reading them
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 32 * 1024 * 1024))
+    MAX_UPLOAD_FILE_SIZE = int(os.environ.get('MAX_UPLOAD_FILE_SIZE', 10 * 1024 * 1024))
+    # Uploaded media: None (serve from Python), 'x-accel' (nginx) or 'x-sendfile'
+    UPLOAD_SENDFILE_MODE = os.environ.get('UPLOAD_SENDFILE_MODE') or None
+    UPLOAD_ACCEL_PREFIX = os.environ.get('UPLOAD_ACCEL_PREFIX', '/_uploads/')
+    UPLOAD_MAX_AGE = int(os.environ.get('UPLOAD_MAX_AGE', 24 * 60 * 60))
+    # Orphaned upload GC: grace period, and sweep interval in seconds (0 = CLI only)
+    UPLOAD_GC_GRACE_HOURS = float(os.environ.get('UPLOAD_GC_GRACE_HOURS', 24))
+    UPLOAD_GC_INTERVAL = int(os.environ.get('UPLOAD_GC_INTERVAL', 0))
+    # Guest carts in the database ('db') or in a signed cookie ('cookie'). The
+    # signing secret must be the same on every worker, unlike the random SECRET_KEY
+    GUEST_CART_MODE = os.environ.get('GUEST_CART_MODE', 'db')
+    GUEST_CART_SECRET = os.environ.get('GUEST_CART_SECRET')
+    # Abandoned guest carts: idle lifetime, sweep interval in seconds (0 = CLI only), rows per batch
+    GUEST_CART_TTL_DAYS = float(os.environ.get('GUEST_CART_TTL_DAYS', 30))
+    GUEST_CART_SWEEP_INTERVAL = int(os.environ.get('GUEST_CART_SWEEP_INTERVAL', 3600))
+    GUEST_CART_SWEEP_BATCH = int(os.environ.get('GUEST_CART_SWEEP_BATCH', 500))
+    # Checkout stock holds: lifetime in minutes, expiry sweep interval in seconds (0 = CLI only)
+    STOCK_HOLD_MINUTES = float(os.environ.get('STOCK_HOLD_MINUTES', 15))
+    STOCK_HOLD_SWEEP_INTERVAL = int(os.environ.get('STOCK_HOLD_SWEEP_INTERVAL', 60))
+    # Order archival: orders in these statuses placed more than ORDER_ARCHIVE_AFTER_DAYS
+    # ago move to monthly archive tables; orders per batch, run interval in seconds (0 = CLI only)
+    ORDER_ARCHIVE_AFTER_DAYS = float(os.environ.get('ORDER_ARCHIVE_AFTER_DAYS', 180))
+    ORDER_ARCHIVE_STATUSES = os.environ.get('ORDER_ARCHIVE_STATUSES', 'completed,cancelled')
+    ORDER_ARCHIVE_BATCH = int(os.environ.get('ORDER_ARCHIVE_BATCH', 500))
+    ORDER_ARCHIVE_INTERVAL = int(os.environ.get('ORDER_ARCHIVE_INTERVAL', 0))
+    # Idempotency-Key responses: replay window, how long an unfinished claim
+    # blocks retries, expired-key purge interval in seconds (0 = never)
+    IDEMPOTENCY_KEY_TTL_HOURS = float(os.environ.get('IDEMPOTENCY_KEY_TTL_HOURS', 24))
+    IDEMPOTENCY_LOCK_SECONDS = int(os.environ.get('IDEMPOTENCY_LOCK_SECONDS', 60))
+    IDEMPOTENCY_SWEEP_INTERVAL = int(os.environ.get('IDEMPOTENCY_SWEEP_INTERVAL', 3600))
+    # Shared response cache (SQLite file, defaults to the instance folder)
+    RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+    RESPONSE_CACHE_PATH = os.environ.get('RESPONSE_CACHE_PATH')
+    RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 300))
+    # Stock changes do not invalidate cached catalog reads; listings showing
+    # stock are rebuilt at least this often (seconds)
+    RESPONSE_CACHE_STOCK_TTL = int(os.environ.get('RESPONSE_CACHE_STOCK_TTL', 30))
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 1000))
+    # Response compression (gzip, or brotli when installed)
+    COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', 'true').lower() == 'true'
+    COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 500))
+    COMPRESSION_LEVEL = int(os.environ.get('COMPRESSION_LEVEL', 6))
+    # Pre-encoded product JSON kept per worker
+    PRODUCT_FRAGMENT_CACHE_SIZE = int(os.environ.get('PRODUCT_FRAGMENT_CACHE_SIZE', 5000))
+    # Image derivatives (resized / WebP / placeholder) built in a process pool
+    IMAGE_DERIVATIVES_ENABLED = os.environ.get('IMAGE_DERIVATIVES_ENABLED', 'true').lower() == 'true'
+    IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', 2))
 
 class DevelopmentConfig(Config):
     DEBUG = True
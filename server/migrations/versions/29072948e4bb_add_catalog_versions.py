@@ -0,0 +1,36 @@
+"""Add catalog_versions for ETag / Last-Modified support
+
+Revision ID: 29072948e4bb
+Revises: 7600d232c513
+Create Date: 2026-10-18 09:12:41.503118
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '29072948e4bb'
+down_revision = '7600d232c513'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    catalog_versions = op.create_table('catalog_versions',
+    sa.Column('scope', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('scope')
+    )
+    now = datetime.utcnow()
+    op.bulk_insert(catalog_versions, [
+        {'scope': scope, 'version': 1, 'updated_at': now}
+        for scope in ('products', 'categories', 'blog')
+    ])
+
+
+def downgrade():
+    op.drop_table('catalog_versions')
@@ -0,0 +1,33 @@
+"""Add order_archives, the registry of monthly order archive tables
+
+Revision ID: a7c3e9d14b62
+Revises: f4b7d2e6a913
+Create Date: 2026-10-18 19:05:12.406318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3e9d14b62'
+down_revision = 'f4b7d2e6a913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The orders_archive_<month> / order_lines_archive_<month> tables
+    # themselves are created by `flask orders archive` as months fill up
+    op.create_table('order_archives',
+    sa.Column('month', sa.String(length=7), nullable=False),
+    sa.Column('order_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('month')
+    )
+
+
+def downgrade():
+    # Archive tables are left in place; their orders are no longer read
+    op.drop_table('order_archives')
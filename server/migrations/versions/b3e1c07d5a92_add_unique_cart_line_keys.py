@@ -0,0 +1,75 @@
+"""Add unique cart line keys for guest carts and pending user carts
+
+Revision ID: b3e1c07d5a92
+Revises: aa5fd132393f
+Create Date: 2026-10-18 14:05:37.219406
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e1c07d5a92'
+down_revision = 'aa5fd132393f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Fold duplicate lines left by earlier read-then-insert races into the oldest row
+    op.execute("""
+        UPDATE guest_cart SET quantity = (
+            SELECT sum(g.quantity) FROM guest_cart g
+            WHERE g.session_id = guest_cart.session_id AND g.product_id = guest_cart.product_id
+        )
+        WHERE id IN (SELECT min(id) FROM guest_cart GROUP BY session_id, product_id HAVING count(*) > 1)
+    """)
+    op.execute("""
+        DELETE FROM guest_cart
+        WHERE id NOT IN (SELECT min(id) FROM guest_cart GROUP BY session_id, product_id)
+    """)
+    op.execute("""
+        UPDATE orders SET
+            quantity = (
+                SELECT sum(o.quantity) FROM orders o
+                WHERE o.status = 'pending' AND o.user_id = orders.user_id AND o.product_id = orders.product_id
+            ),
+            total_price = (
+                SELECT sum(o.total_price) FROM orders o
+                WHERE o.status = 'pending' AND o.user_id = orders.user_id AND o.product_id = orders.product_id
+            )
+        WHERE id IN (
+            SELECT min(id) FROM orders WHERE status = 'pending' AND user_id IS NOT NULL
+            GROUP BY user_id, product_id HAVING count(*) > 1
+        )
+    """)
+    op.execute("""
+        DELETE FROM orders
+        WHERE status = 'pending' AND user_id IS NOT NULL
+          AND id NOT IN (
+            SELECT min(id) FROM orders WHERE status = 'pending' AND user_id IS NOT NULL
+            GROUP BY user_id, product_id
+          )
+    """)
+
+    with op.batch_alter_table('guest_cart', schema=None) as batch_op:
+        # The unique key leads with session_id, so the single-column index is redundant
+        batch_op.drop_index('ix_guest_cart_session_id')
+        batch_op.create_index('uq_guest_cart_session_product', ['session_id', 'product_id'], unique=True)
+
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.create_index(
+            'uq_orders_pending_line', ['user_id', 'product_id'], unique=True,
+            sqlite_where=sa.text("status = 'pending'"),
+            postgresql_where=sa.text("status = 'pending'"),
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.drop_index('uq_orders_pending_line')
+
+    with op.batch_alter_table('guest_cart', schema=None) as batch_op:
+        batch_op.drop_index('uq_guest_cart_session_product')
+        batch_op.create_index('ix_guest_cart_session_id', ['session_id'], unique=False)
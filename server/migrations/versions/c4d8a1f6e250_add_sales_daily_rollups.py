@@ -0,0 +1,42 @@
+"""Add sales_daily and sales_day_totals rollups
+
+Revision ID: c4d8a1f6e250
+Revises: b9e2f5c83d17
+Create Date: 2026-10-18 21:02:37.551904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d8a1f6e250'
+down_revision = 'b9e2f5c83d17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Empty until `flask orders rebuild-sales` backfills existing orders
+    op.create_table('sales_daily',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=True),
+    sa.Column('order_count', sa.Integer(), nullable=False),
+    sa.Column('units', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'product_id')
+    )
+
+    op.create_table('sales_day_totals',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('order_count', sa.Integer(), nullable=False),
+    sa.Column('units', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('day')
+    )
+
+
+def downgrade():
+    op.drop_table('sales_day_totals')
+    op.drop_table('sales_daily')
@@ -0,0 +1,38 @@
+"""Add guest_cart.last_touched_at for abandoned cart expiry
+
+Revision ID: c81f4e2a9d36
+Revises: b3e1c07d5a92
+Create Date: 2026-10-18 14:48:12.503916
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c81f4e2a9d36'
+down_revision = 'b3e1c07d5a92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('guest_cart', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('last_touched_at', sa.DateTime(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_guest_cart_last_touched_at'), ['last_touched_at'], unique=False)
+
+    # Existing carts start their idle clock now; bound as a DateTime so the
+    # stored format matches values written by the app
+    op.execute(
+        sa.text("UPDATE guest_cart SET last_touched_at = :now").bindparams(
+            sa.bindparam('now', datetime.utcnow(), type_=sa.DateTime())
+        )
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('guest_cart', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_guest_cart_last_touched_at'))
+        batch_op.drop_column('last_touched_at')
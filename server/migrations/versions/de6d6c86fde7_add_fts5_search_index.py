@@ -0,0 +1,77 @@
+"""Add FTS5 search index over products and blog posts
+
+Revision ID: de6d6c86fde7
+Revises: 29072948e4bb
+Create Date: 2026-10-18 10:02:17.884210
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'de6d6c86fde7'
+down_revision = '29072948e4bb'
+branch_labels = None
+depends_on = None
+
+# rowid = id * 2 for products and id * 2 + 1 for blog posts, so triggers
+# can address index rows directly instead of scanning unindexed columns
+TRIGGERS = [
+    """CREATE TRIGGER products_search_ai AFTER INSERT ON products BEGIN
+        INSERT INTO search_index (rowid, title, body, kind, ref_id)
+        VALUES (new.id * 2, new.name, coalesce(new.description, ''), 'product', new.id);
+    END""",
+    """CREATE TRIGGER products_search_ad AFTER DELETE ON products BEGIN
+        DELETE FROM search_index WHERE rowid = old.id * 2;
+    END""",
+    """CREATE TRIGGER products_search_au AFTER UPDATE OF name, description ON products BEGIN
+        DELETE FROM search_index WHERE rowid = old.id * 2;
+        INSERT INTO search_index (rowid, title, body, kind, ref_id)
+        VALUES (new.id * 2, new.name, coalesce(new.description, ''), 'product', new.id);
+    END""",
+    """CREATE TRIGGER blog_posts_search_ai AFTER INSERT ON blog_posts BEGIN
+        INSERT INTO search_index (rowid, title, body, kind, ref_id)
+        VALUES (new.id * 2 + 1, new.title, new.content, 'blog', new.id);
+    END""",
+    """CREATE TRIGGER blog_posts_search_ad AFTER DELETE ON blog_posts BEGIN
+        DELETE FROM search_index WHERE rowid = old.id * 2 + 1;
+    END""",
+    """CREATE TRIGGER blog_posts_search_au AFTER UPDATE OF title, content ON blog_posts BEGIN
+        DELETE FROM search_index WHERE rowid = old.id * 2 + 1;
+        INSERT INTO search_index (rowid, title, body, kind, ref_id)
+        VALUES (new.id * 2 + 1, new.title, new.content, 'blog', new.id);
+    END""",
+]
+
+
+def upgrade():
+    # FTS5 is SQLite-only; other backends fall back to LIKE search
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    op.execute(
+        "CREATE VIRTUAL TABLE search_index USING fts5("
+        "title, body, kind UNINDEXED, ref_id UNINDEXED, "
+        "tokenize = 'porter unicode61')"
+    )
+    for trigger in TRIGGERS:
+        op.execute(trigger)
+
+    op.execute(
+        "INSERT INTO search_index (rowid, title, body, kind, ref_id) "
+        "SELECT id * 2, name, coalesce(description, ''), 'product', id FROM products"
+    )
+    op.execute(
+        "INSERT INTO search_index (rowid, title, body, kind, ref_id) "
+        "SELECT id * 2 + 1, title, content, 'blog', id FROM blog_posts"
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    for name in ('products_search_ai', 'products_search_ad', 'products_search_au',
+                 'blog_posts_search_ai', 'blog_posts_search_ad', 'blog_posts_search_au'):
+        op.execute(f"DROP TRIGGER IF EXISTS {name}")
+    op.execute("DROP TABLE IF EXISTS search_index")
@@ -0,0 +1,67 @@
+"""Move signed-in users' cart lines from orders into cart_items
+
+Revision ID: e2c94a7b1f08
+Revises: d5a0b8f3c417
+Create Date: 2026-10-18 16:10:05.774129
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2c94a7b1f08'
+down_revision = 'd5a0b8f3c417'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('cart_items',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('added_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('cart_items', schema=None) as batch_op:
+        batch_op.create_index('uq_cart_items_user_product', ['user_id', 'product_id'], unique=True)
+
+    # uq_orders_pending_line guarantees one pending row per user and product
+    op.execute("""
+        INSERT INTO cart_items (user_id, product_id, quantity, added_at)
+        SELECT user_id, product_id, quantity, created_at FROM orders
+        WHERE status = 'pending' AND user_id IS NOT NULL
+        ORDER BY id
+    """)
+    # Pending rows are cart lines, not orders. Those without a user belong
+    # to no session that could claim them, so they are dropped rather than
+    # surviving the order split as phantom pending orders
+    op.execute("DELETE FROM orders WHERE status = 'pending'")
+
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.drop_index('uq_orders_pending_line')
+
+
+def downgrade():
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.create_index(
+            'uq_orders_pending_line', ['user_id', 'product_id'], unique=True,
+            sqlite_where=sa.text("status = 'pending'"),
+            postgresql_where=sa.text("status = 'pending'"),
+        )
+
+    op.execute("""
+        INSERT INTO orders (user_id, product_id, quantity, total_price, status, created_at)
+        SELECT c.user_id, c.product_id, c.quantity, c.quantity * p.price, 'pending', c.added_at
+        FROM cart_items c JOIN products p ON p.id = c.product_id
+        ORDER BY c.id
+    """)
+
+    with op.batch_alter_table('cart_items', schema=None) as batch_op:
+        batch_op.drop_index('uq_cart_items_user_product')
+
+    op.drop_table('cart_items')
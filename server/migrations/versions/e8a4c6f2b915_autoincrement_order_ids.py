@@ -0,0 +1,50 @@
+"""Make orders / order_lines ids AUTOINCREMENT so archived ids are never reused
+
+Revision ID: e8a4c6f2b915
+Revises: d7f1b3a9c542
+Create Date: 2026-10-18 23:40:51.203377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8a4c6f2b915'
+down_revision = 'd7f1b3a9c542'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # PostgreSQL sequences never go backwards; only SQLite reuses max(id) + 1
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite':
+        return
+
+    for table in ('orders', 'order_lines'):
+        with op.batch_alter_table(table, recreate='always',
+                                  table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+            pass
+
+    # The copy seeds sqlite_sequence from the hot rows only; ids already
+    # moved to the archive must stay behind the counter as well
+    months = [row[0] for row in bind.execute(sa.text('SELECT month FROM order_archives'))]
+    for table in ('orders', 'order_lines'):
+        highest = [f'SELECT MAX(id) AS seq FROM {table}']
+        highest += [f'SELECT MAX(id) FROM {table}_archive_{month}' for month in months]
+        seq = bind.execute(sa.text(f"SELECT MAX(seq) FROM ({' UNION ALL '.join(highest)})")).scalar() or 0
+        bind.execute(sa.text('DELETE FROM sqlite_sequence WHERE name = :name'), {'name': table})
+        bind.execute(sa.text('INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)'),
+                     {'name': table, 'seq': seq})
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite':
+        return
+
+    for table in ('order_lines', 'orders'):
+        with op.batch_alter_table(table, recreate='always',
+                                  table_kwargs={'sqlite_autoincrement': False}) as batch_op:
+            pass
@@ -0,0 +1,80 @@
+"""Split orders into an order header and order_lines
+
+Revision ID: f4b7d2e6a913
+Revises: e2c94a7b1f08
+Create Date: 2026-10-18 16:52:48.390552
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4b7d2e6a913'
+down_revision = 'e2c94a7b1f08'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('order_lines',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('order_id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('product_name', sa.String(length=100), nullable=False),
+    sa.Column('unit_price', sa.Float(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('line_total', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['order_id'], ['orders.id'], ),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('order_lines', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_order_lines_order_id'), ['order_id'], unique=False)
+
+    # Every existing single-product order becomes a header with one line.
+    # Old rows may have a zero quantity, or a product that has since been deleted
+    op.execute("""
+        INSERT INTO order_lines (order_id, product_id, product_name, unit_price, quantity, line_total)
+        SELECT o.id, o.product_id, COALESCE(p.name, 'Deleted product #' || o.product_id),
+               COALESCE(o.total_price / NULLIF(o.quantity, 0), p.price, 0),
+               o.quantity, o.total_price
+        FROM orders o LEFT JOIN products p ON p.id = o.product_id
+        ORDER BY o.id
+    """)
+
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('item_count', sa.Integer(), nullable=False, server_default='0'))
+    op.execute("UPDATE orders SET item_count = quantity")
+
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.drop_column('product_id')
+        batch_op.drop_column('quantity')
+        batch_op.create_index('ix_orders_user_created', ['user_id', 'created_at'], unique=False,
+                              postgresql_include=['status', 'total_price', 'item_count'])
+
+
+def downgrade():
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.drop_index('ix_orders_user_created')
+        batch_op.add_column(sa.Column('product_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('quantity', sa.Integer(), nullable=True))
+
+    # Multi-line orders keep only their first line
+    op.execute("""
+        UPDATE orders SET
+            product_id = (SELECT l.product_id FROM order_lines l WHERE l.order_id = orders.id ORDER BY l.id LIMIT 1),
+            quantity = (SELECT l.quantity FROM order_lines l WHERE l.order_id = orders.id ORDER BY l.id LIMIT 1)
+    """)
+    op.execute("DELETE FROM orders WHERE product_id IS NULL")
+
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.alter_column('product_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.alter_column('quantity', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_foreign_key('fk_orders_product_id_products', 'products', ['product_id'], ['id'])
+        batch_op.drop_column('item_count')
+
+    with op.batch_alter_table('order_lines', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_order_lines_order_id'))
+
+    op.drop_table('order_lines')